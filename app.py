@@ -1,78 +1,280 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash
+from flask import (Flask, Blueprint, Response, render_template, jsonify, request, redirect, url_for, flash,
+                   stream_with_context, make_response, abort, current_app, session)
+from flask.cli import pass_script_info
 from flask_login import login_user, logout_user, login_required, current_user
 import os
+import sys
+import subprocess
+import json
+import time
+import tempfile
+import click
 from datetime import datetime
-from database import db, login_manager, User, Project, Application, Message
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import text
+from database import db, login_manager, User, Project, Application, Message, PROJECT_DELETED
 from forms import LoginForm, RegisterForm, ProjectForm, EditProfileForm
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-
-# Настройка базы данных
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///colab_hub.db'
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Инициализация расширений
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+from conversations import (open_conversation, record_message, mark_conversation_read,
+                           user_conversations, rebuild_conversations,
+                           get_unread_total, rebuild_unread_counters, mark_messages_read,
+                           load_message_window, get_read_marks, message_dicts)
+from chat_hub import chat_hub
+from search_index import (ensure_search_index, detect_search_index, drop_search_index, index_project,
+                          rebuild_search_index, apply_search)
+from skills import set_user_skills, has_skill, backfill_user_skills, ensure_skill_index
+from facets import get_facet, invalidate_user_facets, invalidate_project_facets, facet_cache
+from user_cache import user_cache, FRESH_KEY
+from fragments import render_fragment, render_project_cards, invalidate_project_fragments, fragment_cache
+from conditional import (touch_projects, touch_user_projects, projects_version, project_version,
+                         chat_version, chat_etag, conditional, set_validators)
+from stats import get_stats, increment_stat, track_university, reconcile_stats
+from migrations import upgrade, pending_migrations, applied_versions
+from pagination import paginate_keyset, cursor_url
+from roles import roles_text_from_form, set_project_roles, has_role
+from load_profiles import (PROFILE_PROJECTS, PROFILE_APPLICATIONS,
+                           PROJECT_APPLICATIONS, CHAT_APPLICATION, CHAT_MESSAGES)
+from query_budget import init_query_budget, check_route_budgets
+from profiling import init_profiling
+from metrics import init_metrics, collect_metrics, prometheus_text, metrics_json
+from db_pool import engine_options, init_db_pool, pool_stats
+from replicas import init_replicas, REPLICA_BIND
+from passwords import password_hasher, HashingBusy, benchmark_logins, DEFAULT_COSTS
+from deletion import (visible_projects, get_project_or_404, get_application_or_404,
+                      soft_delete_project, delete_project_rows, delete_application_rows,
+                      purge_deleted_projects)
+
+
+# Маршруты, обработчики ошибок и команды собираются в blueprint при импорте модуля,
+# а подключаются к приложению в create_app(). Эндпоинты — main.<функция>
+# (url_for('main.projects')), команды flask — без группы (flask db-upgrade)
+main = Blueprint('main', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    # Настройка и регистрация маршрутов; из базы данных — только проверка индекса FTS5 (SQLite).
+    # Схему создаёт bootstrap_database() (flask db-upgrade), а не каждый воркер при импорте
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+
+    # Настройка базы данных
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(os.environ.get('DATABASE_URL', 'sqlite:///colab_hub.db'))
+
+    # Реплика для чтения: тяжёлые GET-страницы читают с неё; после записи пользователь
+    # REPLICA_STICKY_SECONDS читает с основного сервера
+    app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Пул соединений: размер, ожидание свободного соединения (с), пересоздание соединений (с).
+    # DB_PGBOUNCER=1 — соединения держит pgbouncer (transaction pooling), а не приложение.
+    # DB_STATEMENT_TIMEOUT — предел времени SQL-запроса веб-запроса в мс (Postgres), 0 — без предела
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    app.config['DB_PGBOUNCER'] = os.environ.get('DB_PGBOUNCER') == '1'
+    app.config['DB_STATEMENT_TIMEOUT'] = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+
+    # Потоковая доставка сообщений чата (SSE): сколько держим соединение и как часто шлём ping
+    app.config['CHAT_STREAM_TIMEOUT'] = int(os.environ.get('CHAT_STREAM_TIMEOUT', 25))
+    app.config['CHAT_STREAM_HEARTBEAT'] = int(os.environ.get('CHAT_STREAM_HEARTBEAT', 10))
+    # Поток занимает поток gthread-воркера; сверх CHAT_MAX_STREAMS на процесс — 503,
+    # клиент переходит на опрос. По умолчанию — половина из --threads 8
+    app.config['CHAT_MAX_STREAMS'] = int(os.environ.get('CHAT_MAX_STREAMS', 4))
+
+    # Сколько последних сообщений показываем при открытии чата и подгружаем за раз
+    app.config['CHAT_PAGE_SIZE'] = int(os.environ.get('CHAT_PAGE_SIZE', 50))
+
+    # Мягкое удаление проектов: проект скрывается сразу, сообщения удаляет purge-deleted порциями
+    app.config['PROJECT_SOFT_DELETE'] = os.environ.get('PROJECT_SOFT_DELETE', '1') == '1'
+    app.config['PURGE_BATCH_SIZE'] = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+
+    # Хэширование паролей: алгоритм (scrypt или pbkdf2), стоимость и размер пула процессов
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_COST'] = int(os.environ.get('PASSWORD_HASH_COST', 0)) or None
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_TIMEOUT'] = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # Строгий режим бюджета SQL-запросов: превышение — ошибка, а не предупреждение в логе
+    app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+
+    # Профилирование запросов: Server-Timing и строка JSON в логе для запросов дольше
+    # PROFILING_LOG_MS мс; N+1 — одинаковый запрос PROFILING_N_PLUS_ONE раз и больше
+    app.config['PROFILING'] = os.environ.get('PROFILING') == '1'
+    app.config['PROFILING_LOG_MS'] = int(os.environ.get('PROFILING_LOG_MS', 0))
+    app.config['PROFILING_N_PLUS_ONE'] = int(os.environ.get('PROFILING_N_PLUS_ONE', 5))
+
+    # Метрики /metrics: воркеры раз в METRICS_FLUSH_SECONDS пишут снимки в общий каталог.
+    # METRICS_TOKEN — ключ служебных эндпоинтов (/metrics, /api/cache-stats, /api/pool-stats):
+    # заголовок Authorization: Bearer <token>; без токена эти эндпоинты отключены
+    app.config['METRICS'] = os.environ.get('METRICS', '1') == '1'
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR',
+                                               os.path.join(tempfile.gettempdir(), 'colab-hub-metrics'))
+    app.config['METRICS_FLUSH_SECONDS'] = int(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    if config:
+        app.config.update(config)
+
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config))
+    if app.config['DATABASE_REPLICA_URL']:
+        replica_uri = database_uri(app.config['DATABASE_REPLICA_URL'])
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = {
+            'url': replica_uri, **engine_options(replica_uri, app.config)}
+
+    # Инициализация расширений
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'main.login'
+    password_hasher.init_app(app)
+    init_db_pool(app, db)
+    init_replicas(app)
+
+    # Подсчёт SQL-запросов и бюджеты для горячих маршрутов
+    init_query_budget(app, db)
+    init_profiling(app, db)
+    init_metrics(app, db)
+    detect_search_index(app)
+
+    # Ссылки курсорной пагинации в шаблонах
+    app.add_template_global(cursor_url)
+
+    app.register_blueprint(main)
+
+    return app
+
+
+def database_uri(url):
+    # Render выдаёт postgres://, SQLAlchemy понимает только postgresql://
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def bootstrap_database():
+    # Миграции и служебные индексы (FTS5, навыки); нужен контекст приложения
+    applied = upgrade()
+    ensure_search_index()
+    ensure_skill_index()
+    return applied
+
+
+def warmup(app):
+    # Компилирует все шаблоны заранее: с gunicorn --preload это делается один раз
+    # в мастер-процессе, и первый запрос воркера не платит за компиляцию
+    started = time.perf_counter()
+    templates = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in templates:
+        app.jinja_env.get_template(name)
+    return len(templates), time.perf_counter() - started
+
+
+# Порядок выдачи в списках: сначала новые
+NEWEST_PROJECTS = [(Project.created_at, True), (Project.id, True)]
+NEWEST_USERS = [(User.created_at, True), (User.id, True)]
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Снимок из кэша процесса вместо SELECT на каждый запрос (опросы чата и т.п.)
+    return user_cache.load(int(user_id), session.get(FRESH_KEY, 0))
 
 
 # ========== МАРШРУТЫ ==========
 
-@app.route('/')
+@main.route('/')
 def index():
     projects = Project.query.filter_by(status='active').order_by(Project.created_at.desc()).limit(6).all()
-    stats = {
-        'projects': Project.query.count(),
-        'users': User.query.count(),
-        'universities': db.session.query(User.university).distinct().count()
-    }
+    stats = get_stats()
     return render_template('index.html', projects=projects, stats=stats, current_user=current_user)
 
 
-@app.route('/health')
+@main.route('/api/stats')
+def api_stats():
+    return jsonify(get_stats())
+
+
+def require_internal_access():
+    # Служебные эндпоинты (/metrics, /api/*-stats) — только с заголовком
+    # Authorization: Bearer <METRICS_TOKEN>; без заданного токена их нет
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+
+
+@main.route('/api/cache-stats')
+def api_cache_stats():
+    # Счётчики кэшей текущего процесса
+    require_internal_access()
+    return jsonify({
+        'users': user_cache.stats(),
+        'facets': {'hits': facet_cache.hits, 'misses': facet_cache.misses},
+        'fragments': fragment_cache.stats(),
+    })
+
+
+@main.route('/api/pool-stats')
+def api_pool_stats():
+    # Пулы соединений текущего процесса: занятость и ожидание свободного соединения
+    require_internal_access()
+    return jsonify({key or 'primary': pool_stats(engine) for key, engine in db.engines.items()})
+
+
+@main.route('/metrics')
+def metrics():
+    # Метрики всех воркеров: формат Prometheus, ?format=json — то же в JSON
+    if not current_app.config['METRICS']:
+        abort(404)
+    require_internal_access()
+    merged = collect_metrics()
+    if request.args.get('format') == 'json':
+        return jsonify(metrics_json(merged))
+    return Response(prometheus_text(merged), mimetype='text/plain; version=0.0.4')
+
+
+@main.route('/health')
 def health():
     return jsonify({'status': 'healthy'}), 200
 
 
 # ---------- АВТОРИЗАЦИЯ ----------
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        try:
+            valid = user is not None and password_hasher.check(user.password_hash, form.password.data)
+            # Хэш со старым алгоритмом или стоимостью заменяем, пока пароль известен
+            if valid and password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.hash(form.password.data)
+                db.session.commit()
+        except HashingBusy:
+            flash('Сервер перегружен, попробуйте войти через несколько секунд', 'warning')
+            return render_template('login.html', form=form), 503
+
+        if valid:
             login_user(user, remember=True)
             flash('Вы успешно вошли в систему!', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Неверный email или пароль', 'danger')
 
     return render_template('login.html', form=form)
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
 
     form = RegisterForm()
 
@@ -83,24 +285,35 @@ def register():
 
         if existing_user:
             flash('Пользователь с таким email или логином уже существует', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
+
+        try:
+            password_hash = password_hasher.hash(form.password.data)
+        except HashingBusy:
+            flash('Сервер перегружен, попробуйте зарегистрироваться через несколько секунд', 'warning')
+            return render_template('register.html', form=form), 503
 
         user = User(
             username=form.username.data,
             email=form.email.data,
-            password_hash=generate_password_hash(form.password.data),
+            password_hash=password_hash,
             full_name=form.full_name.data,
             university=form.university.data,
             faculty=form.faculty.data,
             course=int(form.course.data) if form.course.data and form.course.data.isdigit() else 1,
             skills=form.skills.data
         )
+        set_user_skills(user, form.skills.data)
 
         db.session.add(user)
+        db.session.flush()
+        increment_stat('users')
+        track_university(user.id, new=user.university)
         db.session.commit()
+        invalidate_user_facets()
 
         flash('Регистрация успешна! Теперь войдите в систему.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     for field, errors in form.errors.items():
         for error in errors:
@@ -109,19 +322,21 @@ def register():
     return render_template('register.html', form=form)
 
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('Вы вышли из системы', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/profile')
+@main.route('/profile')
 @login_required
 def profile():
-    user_projects = Project.query.filter_by(creator_id=current_user.id).all()
-    applications = Application.query.filter_by(user_id=current_user.id).all()
+    user_projects = visible_projects().options(*PROFILE_PROJECTS).filter_by(creator_id=current_user.id).all()
+    applications = Application.query.options(*PROFILE_APPLICATIONS) \
+        .join(Project, Application.project_id == Project.id) \
+        .filter(Application.user_id == current_user.id, Project.status != PROJECT_DELETED).all()
     return render_template('profile.html',
                            user_projects=user_projects,
                            applications=applications,
@@ -130,7 +345,7 @@ def profile():
 
 # ---------- СТРАНИЦА СТУДЕНТОВ ----------
 
-@app.route('/students')
+@main.route('/students')
 def students():
     search = request.args.get('search', '')
     university = request.args.get('university', '')
@@ -149,78 +364,66 @@ def students():
         query = query.filter(User.university == university)
 
     if skill_filter:
-        query = query.filter(User.skills.ilike(f'%{skill_filter}%'))
+        query = query.filter(has_skill(skill_filter))
 
-    students = query.order_by(User.created_at.desc()).all()
-
-    universities = db.session.query(User.university).distinct().all()
-
-    all_skills = set()
-    for student in User.query.all():
-        if student.skills:
-            for skill in student.skills.split(','):
-                all_skills.add(skill.strip().lower())
+    students = paginate_keyset(query, NEWEST_USERS, per_page=24, cursor=request.args.get('cursor'))
 
     return render_template('students.html',
                            students=students,
-                           universities=[u[0] for u in universities if u[0]],
-                           skills=sorted(all_skills),
+                           universities=get_facet('universities'),
+                           skills=get_facet('skills'),
                            search_query=search,
                            current_user=current_user)
 
 
 # ---------- ПРОЕКТЫ ----------
 
-@app.route('/projects')
+@main.route('/projects')
 def projects():
-    page = request.args.get('page', 1, type=int)
-    per_page = 9
+    # Список меняется только вместе с проектами — повторный запрос без изменений получает 304
+    version, changed_at = projects_version()
+    viewer = current_user.id if current_user.is_authenticated else 'anon'
+    etag = f"projects-{version}-{viewer}"
+    not_modified = conditional(etag, changed_at)
+    if not_modified:
+        return not_modified
 
-    projects_list = Project.query.filter_by(status='active') \
-        .order_by(Project.created_at.desc()) \
-        .paginate(page=page, per_page=per_page, error_out=False)
+    role = request.args.get('role', '')
 
-    return render_template('projects.html',
-                           projects=projects_list,
-                           current_user=current_user)
+    # Роли и автор загружаются только для карточек, которых нет в кэше фрагментов
+    projects_query = Project.query.filter_by(status='active')
+    if role:
+        projects_query = projects_query.filter(has_role(role))
+
+    projects_list = paginate_keyset(projects_query, NEWEST_PROJECTS,
+                                    per_page=9, cursor=request.args.get('cursor'))
 
+    cards = render_project_cards('card', 'fragments/project_card.html', projects_list.items)
 
-@app.route('/project/<int:project_id>')
+    response = make_response(render_template('projects.html',
+                                             projects=projects_list,
+                                             cards=cards,
+                                             selected_role=role,
+                                             stats=get_stats(),
+                                             current_user=current_user))
+    return set_validators(response, etag, changed_at)
+
+
+@main.route('/project/<int:project_id>')
 def project_detail(project_id):
-    project = Project.query.get_or_404(project_id)
-
-    needed_roles = []
-    if project.needed_roles:
-        lines = project.needed_roles.strip().split('\n')
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if ':' in line:
-                parts = line.split(':', 1)
-                role_name = parts[0].strip()
-                level = parts[1].strip() if len(parts) > 1 else 'любой'
-            else:
-                role_name = line
-                level = 'любой'
-
-            if role_name:
-                needed_roles.append({
-                    'role': role_name,
-                    'level': level,
-                    'full': f"{role_name} ({level})"
-                })
-
-    if not needed_roles and project.needed_roles:
-        roles_list = [r.strip() for r in project.needed_roles.split(',') if r.strip()]
-        for role_name in roles_list:
-            needed_roles.append({
-                'role': role_name,
-                'level': 'любой',
-                'full': role_name
-            })
+    # Для гостей страница зависит только от проекта и его автора
+    etag = updated_at = None
+    if not current_user.is_authenticated:
+        version = project_version(project_id)
+        if version is None:
+            abort(404)
+        updated_at = version.updated_at
+        etag = f"project-{project_id}-{updated_at.isoformat() if updated_at else 0}"
+        not_modified = conditional(etag, updated_at)
+        if not_modified:
+            return not_modified
+
+    project = get_project_or_404(project_id)
 
     has_applied = False
     application_id = None
@@ -233,34 +436,30 @@ def project_detail(project_id):
             has_applied = True
             application_id = application.id
 
-    return render_template('project_detail.html',
-                           project=project,
-                           needed_roles=needed_roles,
-                           has_applied=has_applied,
-                           application_id=application_id,
-                           current_user=current_user)
-
-
-@app.route('/create_project', methods=['GET', 'POST'])
+    # Общая для всех часть страницы — из кэша фрагментов, заявка и кнопки автора — каждый раз
+    response = make_response(render_template('project_detail.html',
+                                             project=project,
+                                             detail_main=render_fragment(
+                                                 'detail_main', 'fragments/project_detail_main.html', project),
+                                             detail_author=render_fragment(
+                                                 'detail_author', 'fragments/project_author.html', project),
+                                             has_applied=has_applied,
+                                             application_id=application_id,
+                                             current_user=current_user))
+    if etag:
+        set_validators(response, etag, updated_at)
+    return response
+
+
+@main.route('/create_project', methods=['GET', 'POST'])
 @login_required
 def create_project():
     form = ProjectForm()
     if form.validate_on_submit():
-        roles_text = ""
-        if hasattr(form.needed_roles, 'data') and form.needed_roles.data:
-            if isinstance(form.needed_roles.data, list):
-                for role in form.needed_roles.data:
-                    roles_text += f"{role}:средний\n"
-            else:
-                roles_text = form.needed_roles.data
-        elif form.needed_roles.data:
-            roles_text = form.needed_roles.data
-
         project = Project(
             title=form.title.data,
             description=form.description.data,
             category=form.category.data,
-            needed_roles=roles_text,
             difficulty=form.difficulty.data,
             location_type=form.location_type.data,
             university_filter=form.university_filter.data or current_user.university,
@@ -268,57 +467,59 @@ def create_project():
             estimated_duration=form.estimated_duration.data,
             creator_id=current_user.id
         )
+        set_project_roles(project, roles_text_from_form(form.needed_roles.data))
 
         db.session.add(project)
+        db.session.flush()
+        index_project(project)
+        increment_stat('projects')
+        touch_projects()
         db.session.commit()
+        invalidate_project_facets()
 
         flash('Проект успешно создан!', 'success')
-        return redirect(url_for('project_detail', project_id=project.id))
+        return redirect(url_for('main.project_detail', project_id=project.id))
 
     return render_template('create_project.html', form=form)
 
 
-@app.route('/project/<int:project_id>/edit', methods=['GET', 'POST'])
+@main.route('/project/<int:project_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_project(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = get_project_or_404(project_id)
 
     if project.creator_id != current_user.id:
         flash('У вас нет прав редактировать этот проект', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     form = ProjectForm()
 
     if form.validate_on_submit():
-        roles_text = ""
-        if hasattr(form.needed_roles, 'data') and form.needed_roles.data:
-            if isinstance(form.needed_roles.data, list):
-                for role in form.needed_roles.data:
-                    roles_text += f"{role}:средний\n"
-            else:
-                roles_text = form.needed_roles.data
-        elif form.needed_roles.data:
-            roles_text = form.needed_roles.data
-
         project.title = form.title.data
         project.description = form.description.data
         project.category = form.category.data
-        project.needed_roles = roles_text
+        set_project_roles(project, roles_text_from_form(form.needed_roles.data))
         project.difficulty = form.difficulty.data
         project.location_type = form.location_type.data
         project.university_filter = form.university_filter.data
         project.faculty_filter = form.faculty_filter.data
         project.estimated_duration = form.estimated_duration.data
+        # Явно: если изменились только роли, UPDATE проекта не выполняется и onupdate не срабатывает
+        project.updated_at = datetime.utcnow()
 
+        index_project(project)
+        touch_projects()
         db.session.commit()
+        invalidate_project_facets()
+        invalidate_project_fragments(project.id)
         flash('Проект успешно обновлен!', 'success')
-        return redirect(url_for('project_detail', project_id=project.id))
+        return redirect(url_for('main.project_detail', project_id=project.id))
 
     if request.method == 'GET':
         form.title.data = project.title
         form.description.data = project.description
         form.category.data = project.category
-        form.needed_roles.data = project.needed_roles
+        form.needed_roles.data = [role.name for role in project.roles]
         form.difficulty.data = project.difficulty
         form.location_type.data = project.location_type
         form.university_filter.data = project.university_filter
@@ -328,39 +529,41 @@ def edit_project(project_id):
     return render_template('edit_project.html', form=form, project=project)
 
 
-@app.route('/project/<int:project_id>/delete', methods=['POST'])
+@main.route('/project/<int:project_id>/delete', methods=['POST'])
 @login_required
 def delete_project(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = get_project_or_404(project_id)
 
     if project.creator_id != current_user.id:
         flash('У вас нет прав удалить этот проект', 'danger')
-        return redirect(url_for('index'))
-
-    # Удаляем сообщения и заявки
-    applications = Application.query.filter_by(project_id=project_id).all()
-    for app in applications:
-        Message.query.filter_by(application_id=app.id).delete()
+        return redirect(url_for('main.index'))
 
-    Application.query.filter_by(project_id=project_id).delete()
-
-    db.session.delete(project)
+    # Сообщения, заявки и роли удаляются множественными DELETE; в мягком режиме —
+    # фоновой очисткой, а проект скрывается сразу
+    if current_app.config['PROJECT_SOFT_DELETE']:
+        soft_delete_project(project)
+    else:
+        delete_project_rows(project.id)
+    increment_stat('projects', -1)
+    touch_projects()
     db.session.commit()
+    invalidate_project_facets()
+    invalidate_project_fragments(project_id)
 
     flash('Проект успешно удален', 'success')
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
 
 
 # ---------- ЗАЯВКИ ----------
 
-@app.route('/project/<int:project_id>/apply', methods=['POST'])
+@main.route('/project/<int:project_id>/apply', methods=['POST'])
 @login_required
 def apply_to_project(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = get_project_or_404(project_id)
 
     if project.creator_id == current_user.id:
         flash('Вы не можете подать заявку на свой проект', 'warning')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     existing = Application.query.filter_by(
         project_id=project_id,
@@ -369,43 +572,28 @@ def apply_to_project(project_id):
 
     if existing:
         flash('Вы уже подали заявку на этот проект', 'warning')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     role = request.form.get('role', '').strip()
     message = request.form.get('message', '').strip()
 
     if not role:
         flash('Пожалуйста, выберите роль', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     if not message:
         flash('Пожалуйста, напишите сообщение', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     if len(message) < 10:
         flash('Сообщение слишком короткое (минимум 10 символов)', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
-    valid_roles = []
-    if project.needed_roles:
-        lines = project.needed_roles.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if ':' in line:
-                valid_role = line.split(':')[0].strip()
-                valid_roles.append(valid_role)
-            else:
-                valid_roles.append(line.strip())
-
-    if not valid_roles and project.needed_roles:
-        valid_roles = [r.strip() for r in project.needed_roles.split(',') if r.strip()]
+    valid_roles = [r.name for r in project.roles]
 
     if valid_roles and role not in valid_roles:
         flash(f'Роль "{role}" не найдена в списке требуемых ролей для этого проекта', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
     application = Application(
         project_id=project_id,
@@ -415,56 +603,56 @@ def apply_to_project(project_id):
     )
 
     db.session.add(application)
+    db.session.flush()
+    open_conversation(application, project)
     db.session.commit()
 
     flash('Заявка успешно отправлена! Ожидайте ответа от автора проекта.', 'success')
-    return redirect(url_for('project_detail', project_id=project_id))
+    return redirect(url_for('main.project_detail', project_id=project_id))
 
 
-@app.route('/application/<int:app_id>/cancel', methods=['POST'])
+@main.route('/application/<int:app_id>/cancel', methods=['POST'])
 @login_required
 def cancel_application(app_id):
-    application = Application.query.get_or_404(app_id)
+    application = get_application_or_404(app_id)
 
     if application.user_id != current_user.id:
         flash('У вас нет прав отменить эту заявку', 'danger')
-        return redirect(url_for('profile'))
-
-    # Удаляем сообщения
-    Message.query.filter_by(application_id=app_id).delete()
+        return redirect(url_for('main.profile'))
 
-    db.session.delete(application)
+    # Удаляем сообщения, сводку диалога и заявку
+    delete_application_rows(app_id)
     db.session.commit()
 
     flash('Заявка успешно отменена', 'success')
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
 
 
-@app.route('/project/<int:project_id>/applications')
+@main.route('/project/<int:project_id>/applications')
 @login_required
 def project_applications(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = get_project_or_404(project_id)
 
     if project.creator_id != current_user.id:
         flash('У вас нет прав просматривать заявки на этот проект', 'danger')
-        return redirect(url_for('project_detail', project_id=project_id))
+        return redirect(url_for('main.project_detail', project_id=project_id))
 
-    applications = Application.query.filter_by(project_id=project_id).all()
+    applications = Application.query.options(*PROJECT_APPLICATIONS).filter_by(project_id=project_id).all()
     return render_template('project_applications.html',
                            project=project,
                            applications=applications,
                            current_user=current_user)
 
 
-@app.route('/application/<int:app_id>/<action>')
+@main.route('/application/<int:app_id>/<action>')
 @login_required
 def handle_application(app_id, action):
-    application = Application.query.get_or_404(app_id)
-    project = Project.query.get_or_404(application.project_id)
+    application = get_application_or_404(app_id)
+    project = application.project
 
     if project.creator_id != current_user.id:
         flash('У вас нет прав для этого действия', 'danger')
-        return redirect(url_for('project_detail', project_id=project.id))
+        return redirect(url_for('main.project_detail', project_id=project.id))
 
     if action == 'accept':
         application.status = 'accepted'
@@ -476,17 +664,21 @@ def handle_application(app_id, action):
         flash('Неизвестное действие', 'danger')
 
     db.session.commit()
-    return redirect(url_for('project_applications', project_id=project.id))
+    return redirect(url_for('main.project_applications', project_id=project.id))
 
 
 # ---------- РЕДАКТИРОВАНИЕ ПРОФИЛЯ ----------
 
-@app.route('/profile/edit', methods=['GET', 'POST'])
+@main.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     form = EditProfileForm()
 
     if form.validate_on_submit():
+        university_before = current_user.university
+        university_changed = university_before != form.university.data
+        faculty_before = current_user.faculty
+
         current_user.full_name = form.full_name.data
         current_user.university = form.university.data
         current_user.faculty = form.faculty.data
@@ -497,14 +689,21 @@ def edit_profile():
             current_user.course = 1
 
         current_user.skills = form.skills.data
+        set_user_skills(current_user, form.skills.data)
 
         # Используем только если поле есть в форме
         if hasattr(form, 'bio'):
             current_user.bio = form.bio.data
 
+        if university_changed:
+            track_university(current_user.id, new=form.university.data, old=university_before)
+        if university_changed or current_user.faculty != faculty_before:
+            touch_user_projects(current_user.id)
+
         db.session.commit()
+        invalidate_user_facets()
         flash('Профиль успешно обновлен!', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     if request.method == 'GET':
         form.full_name.data = current_user.full_name or ''
@@ -522,104 +721,50 @@ def edit_profile():
 
 # ---------- ЧАТЫ ----------
 
-@app.route('/chats')
+@main.route('/chats')
 @login_required
 def chats():
-    # Получаем все заявки пользователя (как соискателя)
-    user_applications = Application.query.filter_by(user_id=current_user.id).all()
-
-    # Получаем все проекты пользователя (как создателя)
-    user_projects = Project.query.filter_by(creator_id=current_user.id).all()
-
     all_chats = []
 
-    # 1. Чаты где вы соискатель
-    for app in user_applications:
-        if app and app.project:
-            # Получаем последнее сообщение
-            last_message = Message.query.filter_by(application_id=app.id) \
-                .order_by(Message.created_at.desc()).first()
-
-            # Считаем непрочитанные сообщения
-            unread_count = 0
-            try:
-                unread_count = Message.query.filter_by(
-                    application_id=app.id,
-                    is_read=False
-                ).filter(Message.sender_id != current_user.id).count()
-            except:
-                pass  # Если поле еще не создано
-
-            all_chats.append({
-                'id': app.id,
-                'type': 'applicant',
-                'project': app.project,
-                'application': app,
-                'interlocutor': app.project.creator if app.project.creator else current_user,
-                'last_message': last_message.content if last_message else (app.message or "Нет сообщений"),
-                'last_message_time': last_message.created_at if last_message else app.created_at,
-                'unread_count': unread_count
-            })
-
-    # 2. Чаты где вы создатель проекта
-    for project in user_projects:
-        if project:
-            applications = Application.query.filter_by(project_id=project.id).all()
-            for app in applications:
-                if app:
-                    # Получаем последнее сообщение
-                    last_message = Message.query.filter_by(application_id=app.id) \
-                        .order_by(Message.created_at.desc()).first()
-
-                    # Считаем непрочитанные сообщения
-                    unread_count = 0
-                    try:
-                        unread_count = Message.query.filter_by(
-                            application_id=app.id,
-                            is_read=False
-                        ).filter(Message.sender_id != current_user.id).count()
-                    except:
-                        pass  # Если поле еще не создано
-
-                    all_chats.append({
-                        'id': app.id,
-                        'type': 'creator',
-                        'project': project,
-                        'application': app,
-                        'interlocutor': app.applicant if app.applicant else current_user,
-                        'last_message': last_message.content if last_message else (app.message or "Нет сообщений"),
-                        'last_message_time': last_message.created_at if last_message else app.created_at,
-                        'unread_count': unread_count
-                    })
-
-    # Сортируем по времени последнего сообщения
-    all_chats.sort(key=lambda x: x['last_message_time'], reverse=True)
+    # Сводки диалогов одним запросом, уже отсортированные по последней активности
+    for conversation in user_conversations(current_user.id):
+        is_applicant = conversation.applicant_id == current_user.id
+        all_chats.append({
+            'id': conversation.application_id,
+            'type': 'applicant' if is_applicant else 'creator',
+            'project': conversation.project,
+            'interlocutor': conversation.creator if is_applicant else conversation.applicant,
+            'last_message': conversation.last_message_text or "Нет сообщений",
+            'last_message_time': conversation.last_message_at,
+            'unread_count': conversation.unread_for(current_user.id)
+        })
 
     return render_template('Chats.html',
                            chats=all_chats,
                            current_user=current_user)
 
 
-@app.route('/chat/<int:application_id>')
+@main.route('/chat/<int:application_id>')
 @login_required
 def chat(application_id):
-    application = Application.query.get_or_404(application_id)
+    application = get_application_or_404(application_id, *CHAT_APPLICATION)
     project = application.project
 
     # Проверяем доступ: только участники заявки могут видеть чат
     if application.user_id != current_user.id and project.creator_id != current_user.id:
         flash('У вас нет доступа к этому чату', 'danger')
-        return redirect(url_for('chats'))
+        return redirect(url_for('main.chats'))
 
-    # Помечаем сообщения как прочитанные (если поле существует)
+    # Сдвигаем отметку прочтения до последнего сообщения: пишется одна строка read_mark,
+    # строки сообщений не меняются. Коммит - после рендеринга, чтобы не перечитывать
+    # истёкшие объекты заново
+    marks = {}
+    updated = False
     try:
-        Message.query.filter_by(
-            application_id=application_id,
-            is_read=False
-        ).filter(Message.sender_id != current_user.id).update({'is_read': True})
-        db.session.commit()
+        marks = get_read_marks(application_id)
+        updated = mark_conversation_read(application, current_user.id, marks=marks)
     except:
-        pass  # Если поле еще не создано
+        db.session.rollback()  # Если таблица еще не создана
 
     # Определяем собеседника
     if current_user.id == application.user_id:
@@ -629,37 +774,51 @@ def chat(application_id):
         interlocutor = application.applicant  # Вы - создатель проекта
         chat_type = 'creator'
 
-    # Получаем историю сообщений
+    # Получаем последние сообщения (более ранние подгружаются при прокрутке вверх)
     messages = []
+    has_older = False
     try:
-        messages = Message.query.filter_by(application_id=application_id) \
-            .order_by(Message.created_at.asc()).all()
+        messages, has_older = load_message_window(application_id)
     except:
         pass  # Если таблица еще не создана
 
     # Преобразуем в словари
-    messages_data = []
-    for msg in messages:
-        try:
-            msg_dict = msg.to_dict()
-            msg_dict['is_my_message'] = (msg.sender_id == current_user.id)
-            messages_data.append(msg_dict)
-        except:
-            pass
+    messages_data = message_dicts(application, messages, current_user.id, marks)
 
-    return render_template('chat.html',
+    html = render_template('chat.html',
                            application=application,
                            project=project,
                            interlocutor=interlocutor,
                            messages=messages_data,
+                           has_older=has_older,
                            chat_type=chat_type,
                            current_user=current_user)
+    if updated:
+        db.session.commit()
+    return html
 
 
-@app.route('/chat/<int:application_id>/send', methods=['POST'])
+@main.route('/chat/<int:application_id>/history')
+@login_required
+def get_message_history(application_id):
+    application = get_application_or_404(application_id, *CHAT_APPLICATION)
+
+    # Проверяем доступ
+    if application.user_id != current_user.id and application.project.creator_id != current_user.id:
+        return jsonify({'error': 'Нет доступа'}), 403
+
+    before_id = request.args.get('before_id', type=int)
+    messages, has_more = load_message_window(application_id, before_id)
+    marks = get_read_marks(application_id) if messages else {}
+    messages_data = message_dicts(application, messages, current_user.id, marks)
+
+    return jsonify({'messages': messages_data, 'has_more': has_more})
+
+
+@main.route('/chat/<int:application_id>/send', methods=['POST'])
 @login_required
 def send_message(application_id):
-    application = Application.query.get_or_404(application_id)
+    application = get_application_or_404(application_id, *CHAT_APPLICATION)
 
     # Проверяем доступ
     if application.user_id != current_user.id and application.project.creator_id != current_user.id:
@@ -682,6 +841,8 @@ def send_message(application_id):
         )
 
         db.session.add(message)
+        db.session.flush()
+        record_message(application, message)
         db.session.commit()
 
         # Обновляем статус заявки (если нужно)
@@ -689,6 +850,9 @@ def send_message(application_id):
             application.status = 'in_dialog'
             db.session.commit()
 
+        # Рассылаем сообщение открытым потокам этого диалога
+        chat_hub.publish(application_id, message.to_dict())
+
         return jsonify({
             'success': True,
             'message_id': message.id,
@@ -701,10 +865,21 @@ def send_message(application_id):
         return jsonify({'error': 'Ошибка базы данных'}), 500
 
 
-@app.route('/chat/<int:application_id>/messages')
+@main.route('/chat/<int:application_id>/messages')
 @login_required
 def get_messages(application_id):
-    application = Application.query.get_or_404(application_id)
+    # Метка версии — сводка диалога: без новых сообщений и прочтений отвечаем 304,
+    # не загружая заявку и сообщения
+    version = chat_version(application_id, current_user.id)
+    if version:
+        conversation, etag = version
+        if current_user.id not in (conversation.applicant_id, conversation.creator_id):
+            return jsonify({'error': 'Нет доступа'}), 403
+        not_modified = conditional(etag)
+        if not_modified:
+            return not_modified
+
+    application = get_application_or_404(application_id, *CHAT_APPLICATION)
 
     # Проверяем доступ
     if application.user_id != current_user.id and application.project.creator_id != current_user.id:
@@ -714,94 +889,152 @@ def get_messages(application_id):
     last_id = request.args.get('last_id', 0, type=int)
 
     messages = []
+    marks = {}
+    has_unread = False
     try:
-        messages = Message.query.filter_by(application_id=application_id) \
+        messages = Message.query.options(*CHAT_MESSAGES) \
+            .filter_by(application_id=application_id) \
             .filter(Message.id > last_id) \
-            .order_by(Message.created_at.asc()).all()
-
-        # Помечаем как прочитанные
-        for msg in messages:
-            if msg.sender_id != current_user.id:
-                try:
-                    msg.is_read = True
-                except:
-                    pass
+            .order_by(Message.id.asc()).all()
 
-        db.session.commit()
+        # Сдвигаем отметку прочтения; пустой опрос ничего не пишет
+        if messages:
+            marks = get_read_marks(application_id)
+            has_unread = mark_messages_read(application, current_user.id, messages, marks)
     except:
         pass  # Если таблица еще не создана
 
-    # Преобразуем в JSON
-    messages_data = []
-    for msg in messages:
-        try:
-            msg_dict = msg.to_dict()
-            msg_dict['is_my_message'] = (msg.sender_id == current_user.id)
-            messages_data.append(msg_dict)
-        except:
-            pass
+    # Преобразуем в JSON до commit, чтобы не перечитывать сообщения из БД
+    messages_data = message_dicts(application, messages, current_user.id, marks)
+    # Метка — после прочтения: следующий такой же опрос получит 304
+    etag = chat_etag(conversation, current_user.id) if version else None
+
+    if has_unread:
+        db.session.commit()
+
+    response = jsonify({'messages': messages_data})
+    if etag:
+        set_validators(response, etag)
+    return response
+
+
+@main.route('/chat/<int:application_id>/stream')
+@login_required
+def stream_messages(application_id):
+    application = get_application_or_404(application_id, *CHAT_APPLICATION)
+
+    # Проверяем доступ
+    if application.user_id != current_user.id and application.project.creator_id != current_user.id:
+        return jsonify({'error': 'Нет доступа'}), 403
 
-    return jsonify({'messages': messages_data})
+    user_id = current_user.id
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('last_id', 0, type=int)
+
+    # Подписываемся до догрузки из БД, чтобы не потерять сообщения между ними
+    subscription = chat_hub.subscribe(application_id, current_app.config['CHAT_MAX_STREAMS'])
+    if subscription is None:
+        # Свободные потоки воркера нужны остальным запросам
+        return Response(status=503, headers={'Retry-After': '30'})
+
+    # Догружаем сообщения, пропущенные за время переподключения
+    missed = Message.query.options(*CHAT_MESSAGES) \
+        .filter_by(application_id=application_id) \
+        .filter(Message.id > last_id) \
+        .order_by(Message.id.asc()).all()
+    marks = get_read_marks(application_id) if missed else {}
+    has_unread = mark_messages_read(application, user_id, missed, marks)
+    missed = message_dicts(application, missed, user_id, marks)
+    if has_unread:
+        db.session.commit()
 
+    # Пока поток ждёт новых сообщений, соединение с БД не удерживаем
+    db.session.close()
 
-@app.route('/chat/unread_count')
+    timeout = current_app.config['CHAT_STREAM_TIMEOUT']
+    heartbeat = current_app.config['CHAT_STREAM_HEARTBEAT']
+
+    def format_event(msg_dict):
+        msg_dict = dict(msg_dict, is_my_message=(msg_dict['sender_id'] == user_id))
+        return f"id: {msg_dict['id']}\ndata: {json.dumps(msg_dict, ensure_ascii=False)}\n\n"
+
+    def generate():
+        sent_id = last_id
+        try:
+            yield 'retry: 3000\n\n'
+            for msg_dict in missed:
+                sent_id = msg_dict['id']
+                yield format_event(msg_dict)
+
+            deadline = time.monotonic() + timeout
+            while not subscription.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                msg_dict = subscription.get(min(heartbeat, remaining))
+                if msg_dict is None:
+                    # Сообщение, отправленное через другой воркер, до шины этого процесса
+                    # не доходит — раз в heartbeat проверяем БД
+                    batch = [msg.to_dict() for msg in Message.query
+                             .filter_by(application_id=application_id)
+                             .filter(Message.id > sent_id)
+                             .order_by(Message.id.asc()).all()]
+                    db.session.close()
+                    if not batch:
+                        yield ': ping\n\n'
+                        continue
+                else:
+                    batch = [msg_dict]
+
+                for msg_dict in batch:
+                    if msg_dict['id'] <= sent_id:
+                        continue
+
+                    if msg_dict['sender_id'] != user_id:
+                        try:
+                            mark_conversation_read(db.session.get(Application, application_id), user_id,
+                                                   msg_dict['id'])
+                            db.session.commit()
+                            msg_dict = dict(msg_dict, is_read=True)
+                        except Exception as e:
+                            db.session.rollback()
+                            print(f"Ошибка отметки прочтения: {e}")
+                        finally:
+                            db.session.close()
+
+                    sent_id = msg_dict['id']
+                    yield format_event(msg_dict)
+        finally:
+            chat_hub.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@main.route('/chat/unread_count')
 @login_required
 def unread_messages_count():
     try:
-        # Считаем непрочитанные сообщения во всех чатах пользователя
-        total_unread = 0
-
-        # 1. В заявках где вы соискатель
-        user_applications = Application.query.filter_by(user_id=current_user.id).all()
-
-        for app in user_applications:
-            try:
-                unread = Message.query.filter_by(
-                    application_id=app.id,
-                    is_read=False
-                ).filter(Message.sender_id != current_user.id).count()
-                total_unread += unread
-            except:
-                pass
-
-        # 2. В заявках где вы создатель проекта
-        user_projects = Project.query.filter_by(creator_id=current_user.id).all()
-        for project in user_projects:
-            applications = Application.query.filter_by(project_id=project.id).all()
-            for app in applications:
-                try:
-                    unread = Message.query.filter_by(
-                        application_id=app.id,
-                        is_read=False
-                    ).filter(Message.sender_id != current_user.id).count()
-                    total_unread += unread
-                except:
-                    pass
-
-        return jsonify({'unread_count': total_unread})
+        # Счётчик поддерживается при отправке и прочтении сообщений
+        return jsonify({'unread_count': get_unread_total(current_user.id)})
     except:
         return jsonify({'unread_count': 0})
 
 
 # ---------- ПОИСК И ФИЛЬТРАЦИЯ ----------
 
-@app.route('/search')
+@main.route('/search')
 def search_projects():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
     category = request.args.get('category', '')
     university = request.args.get('university', '')
     difficulty = request.args.get('difficulty', '')
+    role = request.args.get('role', '')
 
     # Базовый запрос
     projects_query = Project.query.filter_by(status='active')
 
-    # Применяем фильтры
-    if query:
-        projects_query = projects_query.filter(
-            (Project.title.ilike(f'%{query}%')) |
-            (Project.description.ilike(f'%{query}%'))
-        )
-
     if category and category != 'all':
         projects_query = projects_query.filter_by(category=category)
 
@@ -811,48 +1044,327 @@ def search_projects():
     if difficulty and difficulty != 'all':
         projects_query = projects_query.filter_by(difficulty=difficulty)
 
-    projects = projects_query.order_by(Project.created_at.desc()).all()
+    if role and role != 'all':
+        projects_query = projects_query.filter(has_role(role))
+
+    # Полнотекстовый поиск с сортировкой по релевантности
+    if query:
+        projects_query, page_options = apply_search(projects_query, query)
+    else:
+        page_options = {'sort_keys': NEWEST_PROJECTS}
+
+    projects = paginate_keyset(projects_query, per_page=12, cursor=request.args.get('cursor'),
+                               **page_options)
 
-    # Получаем уникальные значения для фильтров
-    categories = db.session.query(Project.category).distinct().all()
-    universities = db.session.query(Project.university_filter).distinct().all()
+    # Значения для фильтров берём из кэша
     difficulties = ['beginner', 'intermediate', 'advanced']
 
+    cards = render_project_cards('search_card', 'fragments/search_card.html', projects.items)
+
     return render_template('search.html',
                            projects=projects,
+                           cards=cards,
                            search_query=query,
-                           categories=[c[0] for c in categories if c[0]],
-                           universities=[u[0] for u in universities if u[0]],
+                           categories=get_facet('project_categories'),
+                           universities=get_facet('project_universities'),
+                           roles=get_facet('project_roles'),
                            difficulties=difficulties,
                            selected_category=category,
                            selected_university=university,
                            selected_difficulty=difficulty,
+                           selected_role=role,
                            current_user=current_user)
 
 
 # ---------- ОБРАБОТЧИКИ ОШИБОК ----------
 
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def internal_server_error(e):
     print(f"Ошибка 500: {e}")
     return render_template('500.html'), 500
 
 
 
-# ========== ИНИЦИАЛИЗАЦИЯ БАЗЫ ДАННЫХ ==========
+# ---------- КОМАНДЫ ОБСЛУЖИВАНИЯ ----------
+
+@main.cli.command('rebuild-chats')
+def rebuild_chats_command():
+    """Пересчитать сводки диалогов по таблице сообщений."""
+    count = rebuild_conversations()
+    print(f"✅ Пересчитано диалогов: {count}")
+
+
+@main.cli.command('rebuild-unread')
+def rebuild_unread_command():
+    """Пересчитать счётчики непрочитанных сообщений по отметкам прочтения."""
+    count = rebuild_unread_counters()
+    print(f"✅ Пересчитано счётчиков: {count}")
+
+
+@main.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Перестроить полнотекстовый индекс проектов (SQLite FTS5)."""
+    ensure_search_index()
+    count = rebuild_search_index()
+    print(f"✅ Проиндексировано проектов: {count}")
+
+
+@main.cli.command('backfill-skills')
+def backfill_skills_command():
+    """Заполнить таблицы навыков из строк User.skills."""
+    count = backfill_user_skills()
+    print(f"✅ Навыки перенесены для пользователей: {count}")
+
+
+@main.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Сверить счётчики платформы с таблицами."""
+    values = reconcile_stats()
+    print(f"✅ Счётчики обновлены: {values}")
+
+
+@main.cli.command('check-query-budgets', with_appcontext=False)
+@click.option('--user-id', type=int, help='Пользователь, от имени которого открываются страницы')
+@pass_script_info
+def check_query_budgets_command(script_info, user_id):
+    """Открыть горячие маршруты в строгом режиме бюджета SQL-запросов."""
+    app = script_info.load_app()
+    with app.app_context():
+        application = Application.query.order_by(Application.id.desc()).first()
+        if application is None:
+            print("Нет заявок для проверки чатов")
+            sys.exit(1)
+        user_id = user_id or application.project.creator_id
+        project_id = application.project_id
+
+    urls = [
+        '/projects',
+        '/search?q=проект',
+        '/profile',
+        f'/project/{project_id}/applications',
+        f'/chat/{application.id}',
+        f'/chat/{application.id}/messages?last_id=0',
+        f'/chat/{application.id}/history?before_id={2 ** 31}',
+    ]
+
+    failed = False
+    for url, status, error in check_route_budgets(app, user_id, urls):
+        if error:
+            failed = True
+            print(f"❌ {url}: {error}")
+        else:
+            print(f"✅ {url}: {status}")
+    if failed:
+        sys.exit(1)
+
+
+@main.cli.command('purge-deleted')
+@click.option('--batch-size', type=int, help='Сколько сообщений удалять за одну транзакцию')
+@click.option('--limit', type=int, help='Сколько проектов очистить за запуск')
+def purge_deleted_command(batch_size, limit):
+    """Удалить данные мягко удалённых проектов порциями."""
+    projects, messages = purge_deleted_projects(batch_size, limit)
+    print(f"✅ Очищено проектов: {projects}, удалено сообщений: {messages}")
+
+
+@main.cli.command('bench-hashing')
+@click.option('--method', default=None, help='scrypt или pbkdf2 (по умолчанию — из настроек)')
+@click.option('--costs', default=None, help='Стоимости через запятую')
+@click.option('--logins', default=40, help='Сколько входов на каждую стоимость')
+@click.option('--concurrency', default=8, help='Параллельных запросов входа')
+def bench_hashing_command(method, costs, logins, concurrency):
+    """Замерить пропускную способность входа при разных стоимостях хэша."""
+    method = method or current_app.config['PASSWORD_HASH_METHOD']
+    if costs:
+        costs = [int(cost) for cost in costs.split(',')]
+    else:
+        default = DEFAULT_COSTS[method]
+        costs = [default // 4, default // 2, default, default * 2]
+
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    print(f"{method}: {logins} входов, {concurrency} параллельно, процессов хэширования: {workers}")
+    for cost, throughput, latency in benchmark_logins(method, costs, logins, concurrency, workers):
+        print(f"  стоимость {cost:>8}: {throughput:7.1f} входов/с, медиана {latency * 1000:7.1f} мс")
+
+
+@main.cli.command('warmup')
+def warmup_command():
+    """Скомпилировать шаблоны и проверить соединение с БД."""
+    count, elapsed = warmup(current_app)
+    print(f"✅ Шаблонов скомпилировано: {count} за {elapsed * 1000:.0f} мс")
+    started = time.perf_counter()
+    db.session.execute(text('SELECT 1'))
+    print(f"✅ Соединение с БД: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+# Замер в отдельном процессе: импорт модуля, create_app(), прогрев и первый ответ
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+application = module.create_app()
+created = time.perf_counter()
+if sys.argv[2] == '1':
+    module.warmup(application)
+warmed = time.perf_counter()
+status = application.test_client().get(sys.argv[1]).status_code
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'warmup': warmed - created, 'first_response': answered - warmed,
+                  'total': answered - started, 'status': status}))
+"""
+
+
+@main.cli.command('bench-startup', with_appcontext=False)
+@click.option('--runs', default=5, help='Сколько раз запускать процесс')
+@click.option('--url', default='/', help='Адрес первого запроса')
+@click.option('--warm', is_flag=True, help='Вызывать warmup() перед первым запросом')
+def bench_startup_command(runs, url, warm):
+    """Замерить время от импорта приложения до первого ответа."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, url, '1' if warm else '0'],
+                                cwd=root, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{url}: {runs} запусков, статус {results[-1]['status']}, прогрев {'да' if warm else 'нет'}")
+    for phase in ('import', 'create_app', 'warmup', 'first_response', 'total'):
+        values = sorted(result[phase] for result in results)
+        print(f"  {phase:<15} медиана {values[len(values) // 2] * 1000:7.1f} мс, "
+              f"максимум {values[-1] * 1000:7.1f} мс")
+
+
+@main.cli.command('seed')
+@click.option('--users', default=20000, help='Пользователей')
+@click.option('--projects', default=2000, help='Проектов')
+@click.option('--applications', default=6000, help='Заявок')
+@click.option('--messages', default=120000, help='Сообщений')
+@click.option('--project-skew', default=1.0, help='Перекос заявок по проектам (закон Ципфа, 0 — равномерно)')
+@click.option('--chat-tail', default=1.2, help='Хвост длин переписок (Парето, меньше — длиннее хвост)')
+@click.option('--silent-chats', default=0.3, help='Доля заявок без переписки')
+@click.option('--seed', 'random_seed', default=42, help='Зерно генератора: те же параметры — те же данные')
+def seed_command(users, projects, applications, messages, project_skew, chat_tail, silent_chats, random_seed):
+    """Заполнить пустую базу синтетическими данными для нагрузочных проверок."""
+    # Инструменты разработки импортируются в командах: веб-воркерам они не нужны
+    from seed_db import seed_database
+
+    bootstrap_database()
+    if User.query.first() is not None:
+        print("❌ База не пуста — сначала python reset_db.py")
+        sys.exit(1)
+    started = time.perf_counter()
+    counts = seed_database(users, projects, applications, messages, seed=random_seed,
+                           project_skew=project_skew, chat_tail=chat_tail, silent_chats=silent_chats)
+    print(f"✅ Данные сгенерированы за {time.perf_counter() - started:.1f} с: {counts}")
+
+
+@main.cli.command('bench-routes', with_appcontext=False)
+@click.option('--database-url', default='sqlite:///bench.db', help='Отдельная база для бенчмарка')
+@click.option('--users', default=20000, help='Пользователей в синтетических данных')
+@click.option('--projects', default=2000, help='Проектов')
+@click.option('--applications', default=6000, help='Заявок')
+@click.option('--messages', default=120000, help='Сообщений')
+@click.option('--reseed', is_flag=True, help='Удалить данные бенчмарка и сгенерировать заново')
+@click.option('--iterations', default=20, help='Запросов к каждому маршруту за круг')
+@click.option('--rounds', default=3, help='Кругов по всем маршрутам; p50/p95 — медианы по кругам')
+@click.option('--baseline', 'baseline_path', default='bench_baseline.json', help='Файл сохранённого замера')
+@click.option('--save-baseline', 'save', is_flag=True, help='Записать результаты как новый замер')
+@click.option('--tolerance', default=0.25, help='Допустимый рост p50 маршрута относительно остальных (доля)')
+@click.option('--max-slowdown', default=1.5, help='Допустимое замедление всех маршрутов с поправкой на машину')
+def bench_routes_command(database_url, users, projects, applications, messages, reseed,
+                         iterations, rounds, baseline_path, save, tolerance, max_slowdown):
+    """Замерить p50/p95 и число SQL-запросов маршрутов на синтетических данных."""
+    from benchmarks import (calibrate, run_route_benchmarks, compare_with_baseline, speed_factor,
+                            load_baseline, save_baseline)
+    from seed_db import seed_database
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri(database_url), 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        if reseed:
+            db.drop_all()
+            drop_search_index()
+        bootstrap_database()
+        if User.query.first() is None:
+            started = time.perf_counter()
+            counts = seed_database(users, projects, applications, messages)
+            print(f"✅ Данные сгенерированы за {time.perf_counter() - started:.1f} с: {counts}")
+
+    # Скорость машины — до и после маршрутов: она может измениться за время прогона
+    calibration_before = calibrate()
+    results = run_route_benchmarks(app, iterations, rounds=rounds)
+    calibration_ms = round((calibration_before + calibrate()) / 2, 3)
+    baseline = load_baseline(baseline_path)
+
+    print(f"{'маршрут':<22} {'p50, мс':>9} {'p95, мс':>9} {'SQL':>5}")
+    for name, result in results.items():
+        base = (baseline or {}).get('routes', {}).get(name)
+        was = f"  (было p50 {base['p50_ms']}, SQL {base['queries']})" if base else ''
+        print(f"{name:<22} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['queries']:>5}{was}")
+
+    if save:
+        save_baseline(baseline_path, results, calibration_ms)
+        print(f"✅ Замер сохранён в {baseline_path}")
+        return
+    if baseline is None:
+        print("Сохранённого замера нет — запустите с --save-baseline")
+        return
+
+    print(f"Скорость машины относительно замера: x{calibration_ms / baseline['calibration_ms']:.2f}, "
+          f"маршрутов: x{speed_factor(results, baseline):.2f}")
+    regressions = compare_with_baseline(results, calibration_ms, baseline, tolerance, max_slowdown)
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if regressions:
+        sys.exit(1)
+    print("✅ Регрессий нет")
+
+
+@main.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Применить непримененные миграции схемы и создать служебные индексы."""
+    applied = bootstrap_database()
+    for version, name in applied:
+        print(f"✅ Миграция {version}: {name}")
+    if not applied:
+        print("Схема уже актуальна")
+
+
+@main.cli.command('db-status')
+def db_status_command():
+    """Показать примененные и ожидающие миграции."""
+    print(f"Применены: {sorted(applied_versions())}")
+    for version, name, _ in pending_migrations():
+        print(f"⏳ {version}: {name}")
+
+
+@main.cli.command('check-query-plans')
+@click.option('--threshold', default=1000, help='Размер таблицы, начиная с которого полное сканирование считается ошибкой')
+@click.option('--verbose', is_flag=True, help='Печатать планы всех запросов')
+def check_query_plans_command(threshold, verbose):
+    """EXPLAIN для запросов горячих маршрутов; ошибка при полном сканировании больших таблиц."""
+    from query_plans import check_query_plans
+
+    ok, report = check_query_plans(threshold)
+    for item in report:
+        mark = '❌' if item['problems'] else '✅'
+        print(f"{mark} {item['route']}: полные сканирования {item['seq_scans'] or 'нет'}")
+        if verbose or item['problems']:
+            print(item['plan'])
+    if not ok:
+        sys.exit(1)
 
-with app.app_context():
-    try:
-        db.create_all()
-        print("✅ База данных инициализирована")
-    except Exception as e:
-        print(f"⚠️ Предупреждение при инициализации БД: {e}")
 
 if __name__ == '__main__':
+    # Локальный запуск: схема создаётся здесь, в веб-воркерах — командой db-upgrade
+    app = create_app()
+    with app.app_context():
+        bootstrap_database()
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=True)
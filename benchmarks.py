@@ -0,0 +1,194 @@
+import gc
+import json
+import math
+import statistics
+import time
+from sqlalchemy import func
+from database import db, Project, Application, Message, Conversation
+from pagination import encode_cursor
+from query_budget import query_count
+
+
+# Бенчмарк маршрутов: все GET-страницы и опросы чата через тестовый клиент Flask
+# на синтетических данных (seed_db.py). Для каждого маршрута — p50/p95 времени
+# ответа и число SQL-запросов. Сравнение с сохранённым замером: время — медианы по
+# нескольким кругам с поправкой на скорость машины, число запросов — точно.
+
+PROJECTS_PER_PAGE = 9
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(math.ceil(p * len(values)) - 1, 0)]
+
+
+def project_page_url(page):
+    # Курсор страницы N так же, как его строит paginate_keyset для ссылки "вперёд"
+    last = Project.query.filter_by(status='active') \
+        .order_by(Project.created_at.desc(), Project.id.desc()) \
+        .offset((page - 1) * PROJECTS_PER_PAGE - 1).first()
+    return f"/projects?cursor={encode_cursor([last.created_at, last.id], 'next')}"
+
+
+def scenarios():
+    # Самая длинная переписка: её участники — самые тяжёлые пользователи для чатов
+    application_id = db.session.query(Message.application_id) \
+        .group_by(Message.application_id) \
+        .order_by(func.count(Message.id).desc()).limit(1).scalar()
+    application = db.session.get(Application, application_id)
+    project = application.project
+    creator_id = project.creator_id
+    busiest = db.session.query(Conversation.creator_id) \
+        .group_by(Conversation.creator_id) \
+        .order_by(func.count().desc()).limit(1).scalar()
+    first_id, last_id = db.session.query(func.min(Message.id), func.max(Message.id)) \
+        .filter(Message.application_id == application_id).one()
+
+    # (имя, url, id пользователя или None для гостя)
+    return [
+        ('index', '/', None),
+        ('projects', '/projects', None),
+        ('projects_page_10', project_page_url(10), None),
+        ('projects_role', '/projects?role=backend', None),
+        ('project_detail', f'/project/{project.id}', None),
+        ('project_detail_user', f'/project/{project.id}', application.user_id),
+        ('search', '/search?q=разработка', None),
+        ('search_filters', '/search?q=приложение&category=it&difficulty=beginner', None),
+        ('students', '/students', None),
+        ('students_skill', '/students?skill=python', None),
+        ('students_search', '/students?search=Студент+1', None),
+        ('api_stats', '/api/stats', None),
+        ('profile', '/profile', creator_id),
+        ('project_applications', f'/project/{project.id}/applications', creator_id),
+        ('chats', '/chats', busiest),
+        ('chats_creator', '/chats', creator_id),
+        ('unread_count', '/chat/unread_count', creator_id),
+        ('chat', f'/chat/{application_id}', creator_id),
+        # Опрос после переподключения: страница чата знает последнее показанное сообщение
+        ('get_messages', f'/chat/{application_id}/messages?last_id={last_id - 20}', creator_id),
+        ('get_messages_poll', f'/chat/{application_id}/messages?last_id={2 ** 31}', creator_id),
+        ('message_history', f'/chat/{application_id}/history?before_id={first_id + 100}', creator_id),
+    ]
+
+
+def calibrate(rounds=15):
+    # Эталонная нагрузка на CPU без приложения и БД, лучшее время в мс (выбросы от соседей
+    # по машине только увеличивают время). Отношение к замеру — скорость машины:
+    # отличает медленный прогон от медленного кода
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        sum(len(json.dumps({'id': i, 'text': str(i) * 8, 'items': [i, i + 1]})) for i in range(20000))
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 3)
+
+
+def run_route_benchmarks(app, iterations=20, warmup=2, rounds=3):
+    # Вызывать вне app_context: у каждого запроса свои g и сессия, как в gunicorn.
+    # Маршруты обходятся rounds раз по кругу, чтобы дрейф скорости машины задевал все
+    # маршруты одинаково; p50/p95 маршрута — медианы по кругам
+    counts = []
+
+    @app.after_request
+    def record_query_count(response):
+        counts.append(query_count())
+        return response
+
+    with app.app_context():
+        routes = scenarios()
+
+    clients = {}
+    for name, url, user_id in routes:
+        client = clients.get(user_id)
+        if client is None:
+            client = clients[user_id] = app.test_client()
+            if user_id is not None:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+        for _ in range(warmup):
+            client.get(url)
+
+    samples = {name: {'p50': [], 'p95': [], 'queries': 0} for name, _, _ in routes}
+    for _ in range(rounds):
+        for name, url, user_id in routes:
+            client = clients[user_id]
+            # Сборка мусора посреди замера даёт выбросы в p95 у быстрых маршрутов
+            timings = []
+            del counts[:]
+            gc.collect()
+            gc.disable()
+            try:
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{name}: {url} вернул {response.status_code}")
+            finally:
+                gc.enable()
+            samples[name]['p50'].append(percentile(timings, 0.5))
+            samples[name]['p95'].append(percentile(timings, 0.95))
+            samples[name]['queries'] = max(samples[name]['queries'], *counts)
+
+    return {
+        name: {
+            'url': url,
+            'p50_ms': round(statistics.median(samples[name]['p50']) * 1000, 2),
+            'p95_ms': round(statistics.median(samples[name]['p95']) * 1000, 2),
+            'queries': samples[name]['queries'],
+        }
+        for name, url, _ in routes
+    }
+
+
+def speed_factor(results, baseline):
+    # Во сколько раз прогон медленнее замера: медиана отношений p50 по маршрутам
+    routes = baseline['routes']
+    ratios = [result['p50_ms'] / routes[name]['p50_ms'] for name, result in results.items()
+              if routes.get(name, {}).get('p50_ms')]
+    return statistics.median(ratios) if ratios else 1.0
+
+
+def compare_with_baseline(results, calibration_ms, baseline, tolerance=0.25, max_slowdown=1.5, min_ms=2.0):
+    # Три проверки:
+    # - число SQL-запросов совпадает с замером точно (не зависит от машины);
+    # - все маршруты вместе не медленнее замера больше чем в max_slowdown раз с поправкой
+    #   на скорость машины (calibrate) — общая регрессия: пул, потерянный индекс.
+    #   Порог шире tolerance: эталон и маршруты нагружают машину по-разному;
+    # - отдельный маршрут не медленнее остальных больше чем на tolerance и min_ms (шум таймера)
+    routes = baseline['routes']
+    machine = calibration_ms / baseline['calibration_ms']
+    factor = speed_factor(results, baseline)
+    regressions = []
+
+    if factor / machine > max_slowdown:
+        regressions.append(f"все маршруты: медленнее замера в {factor:.2f} раза "
+                           f"при скорости машины x{machine:.2f}")
+
+    for name, result in results.items():
+        base = routes.get(name)
+        if base is None:
+            continue
+        if result['queries'] != base['queries']:
+            regressions.append(f"{name}: SQL-запросов {result['queries']} (в замере {base['queries']}; "
+                               f"если запросов стало меньше — обновите замер)")
+        limit = max(base['p50_ms'] * factor * (1 + tolerance), base['p50_ms'] * factor + min_ms)
+        if result['p50_ms'] > limit:
+            regressions.append(f"{name}: p50 {result['p50_ms']} мс (было {base['p50_ms']} мс, "
+                               f"прогон x{factor:.2f})")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, calibration_ms):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'calibration_ms': calibration_ms, 'routes': results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,60 @@
+import queue
+import threading
+
+
+# Внутрипроцессная шина сообщений чата: подписчики (открытые SSE-потоки)
+# группируются по application_id. Пока новых сообщений нет, потоки ждут
+# на очереди и не обращаются к БД.
+
+class Subscription:
+    def __init__(self, application_id, maxsize=100):
+        self.application_id = application_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Поток не успевал забирать сообщения — клиент переподключится и догрузит их из БД
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ChatHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, application_id, limit=None):
+        # Не больше limit потоков на процесс: каждый держит поток воркера. None — мест нет
+        subscription = Subscription(application_id)
+        with self._lock:
+            if limit is not None and sum(len(s) for s in self._subscribers.values()) >= limit:
+                return None
+            self._subscribers.setdefault(application_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.application_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.application_id]
+
+    def publish(self, application_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(application_id, ()))
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(payload)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def active_streams(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+chat_hub = ChatHub()
@@ -0,0 +1,76 @@
+from datetime import datetime
+from flask import current_app, request, session
+from database import db, Project, PlatformStat, Conversation, PROJECT_DELETED
+from stats import increment_stat
+
+
+# Условные ответы (ETag / Last-Modified -> 304) по дешёвым меткам версий:
+# для чата — последнее сообщение заявки, для списка проектов — счётчик
+# изменений проектов, для страницы проекта — project.updated_at.
+# Основной запрос и шаблон выполняются, только если метка изменилась.
+
+PROJECTS_VERSION = 'projects_version'
+
+
+def touch_projects():
+    # Вызывается в маршрутах, меняющих проекты, в той же транзакции
+    increment_stat(PROJECTS_VERSION)
+
+
+def projects_version():
+    stat = db.session.get(PlatformStat, PROJECTS_VERSION)
+    return (stat.value, stat.updated_at) if stat else (0, None)
+
+
+def project_version(project_id):
+    # Строка (updated_at,) по первичному ключу; None — проекта нет или он удалён
+    return db.session.query(Project.updated_at) \
+        .filter(Project.id == project_id, Project.status != PROJECT_DELETED).first()
+
+
+def touch_user_projects(user_id):
+    # Страница проекта показывает ВУЗ и факультет автора
+    Project.query.filter_by(creator_id=user_id) \
+        .update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+
+
+def chat_version(application_id, user_id):
+    # Сводка диалога меняется при каждом новом сообщении и прочтении
+    conversation = db.session.get(Conversation, application_id)
+    if conversation is None:
+        return None
+    return conversation, chat_etag(conversation, user_id)
+
+
+def chat_etag(conversation, user_id):
+    # Ответ зависит от того, кто смотрит (is_my_message)
+    return (f"chat-{conversation.application_id}-{user_id}-{conversation.last_message_id or 0}-"
+            f"{conversation.applicant_unread}-{conversation.creator_unread}")
+
+
+def not_modified(etag, last_modified=None):
+    # Сообщения flash показываются при следующем рендеринге — такой ответ не кэшируем
+    if '_flashes' in session:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def set_validators(response, etag, last_modified=None):
+    # no-cache: браузер хранит ответ, но каждый раз переспрашивает сервер
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+
+def conditional(etag, last_modified=None):
+    # 304 без тела, если у клиента актуальная версия; иначе None
+    if not_modified(etag, last_modified):
+        return set_validators(current_app.response_class(status=304), etag, last_modified)
+    return None
@@ -0,0 +1,251 @@
+from flask import current_app
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload
+from database import (db, Application, Project, Message, Conversation, ReadMark, UnreadCounter, PROJECT_DELETED,
+                      upsert)
+from load_profiles import CHAT_MESSAGES
+
+
+# Сводки диалогов для страницы /chats. Функции не делают commit —
+# изменения фиксируются вместе с основной операцией маршрута.
+
+def open_conversation(application, project):
+    conversation = Conversation(
+        application_id=application.id,
+        project_id=project.id,
+        applicant_id=application.user_id,
+        creator_id=project.creator_id,
+        last_message_text=application.message,
+        last_message_at=application.created_at
+    )
+    db.session.add(conversation)
+    return conversation
+
+
+def get_conversation(application):
+    conversation = db.session.get(Conversation, application.id)
+    if conversation is None:
+        # Диалог заявки, созданной до появления сводок
+        conversation = open_conversation(application, application.project)
+    return conversation
+
+
+def change_unread_counter(user_id, delta):
+    if not delta:
+        return
+    # Первая строка пользователя и изменение существующей — одним upsert;
+    # изменяем на стороне БД, чтобы параллельные запросы не затирали друг друга
+    new_count = UnreadCounter.count + delta
+    db.session.execute(
+        upsert(UnreadCounter).values(user_id=user_id, count=max(delta, 0))
+        .on_conflict_do_update(index_elements=['user_id'],
+                               set_={'count': case((new_count < 0, 0), else_=new_count)})
+    )
+
+
+def get_unread_total(user_id):
+    counter = db.session.get(UnreadCounter, user_id)
+    return counter.count if counter else 0
+
+
+def record_message(application, message):
+    conversation = get_conversation(application)
+    conversation.last_message_id = message.id
+    conversation.last_message_text = message.content
+    conversation.last_message_at = message.created_at
+
+    if message.sender_id == conversation.applicant_id:
+        conversation.creator_unread = Conversation.creator_unread + 1
+        change_unread_counter(conversation.creator_id, 1)
+    else:
+        conversation.applicant_unread = Conversation.applicant_unread + 1
+        change_unread_counter(conversation.applicant_id, 1)
+    return conversation
+
+
+def get_read_marks(application_id):
+    # Отметки прочтения обоих участников одним запросом: {user_id: ReadMark}
+    return {mark.user_id: mark for mark in ReadMark.query.filter_by(application_id=application_id)}
+
+
+def last_read_id(marks, user_id):
+    mark = marks.get(user_id)
+    return mark.last_read_id if mark else 0
+
+
+def count_unread(application_id, user_id, after_id):
+    # Подсчёт по диапазону индекса (application_id, id) — без сканирования всей переписки
+    return Message.query.filter(Message.application_id == application_id,
+                                Message.id > after_id,
+                                Message.sender_id != user_id).count()
+
+
+def advance_read_mark(application_id, user_id, message_id):
+    # Отметка только растёт: upsert с условием last_read_id < нового значения.
+    # Затронута строка — отметка сдвинулась (вставлена или увеличена)
+    excluded = upsert(ReadMark).excluded
+    result = db.session.execute(
+        upsert(ReadMark).values(application_id=application_id, user_id=user_id, last_read_id=message_id)
+        .on_conflict_do_update(index_elements=['application_id', 'user_id'],
+                               set_={'last_read_id': excluded.last_read_id},
+                               where=ReadMark.last_read_id < excluded.last_read_id)
+    )
+    return result.rowcount > 0
+
+
+def mark_conversation_read(application, user_id, message_id=None, marks=None):
+    # Сдвигает отметку прочтения до message_id (по умолчанию — до последнего сообщения).
+    # Пишется одна строка read_mark и сводка диалога; строки сообщений не меняются.
+    # Возвращает True, если отметка сдвинулась и нужен commit
+    conversation = get_conversation(application)
+    if message_id is None:
+        message_id = conversation.last_message_id
+    marks = get_read_marks(application.id) if marks is None else marks
+
+    if not message_id or message_id <= last_read_id(marks, user_id):
+        return False
+    if not advance_read_mark(application.id, user_id, message_id):
+        # Параллельный запрос уже сдвинул отметку дальше
+        return False
+    # Для message_dicts: объект вне сессии, ORM не запишет его повторно
+    marks[user_id] = ReadMark(application_id=application.id, user_id=user_id, last_read_id=message_id)
+
+    # Сводку читаем заново под блокировкой строки: новое сообщение (record_message)
+    # ждёт нашего commit, и его +1 не потеряется при записи абсолютного значения
+    if inspect(conversation).persistent:
+        db.session.refresh(conversation, with_for_update=True)
+
+    if message_id >= (conversation.last_message_id or 0):
+        unread = 0
+    else:
+        unread = count_unread(application.id, user_id, message_id)
+
+    if user_id == conversation.applicant_id:
+        was_unread = conversation.applicant_unread or 0
+        conversation.applicant_unread = unread
+    else:
+        was_unread = conversation.creator_unread or 0
+        conversation.creator_unread = unread
+    change_unread_counter(user_id, unread - was_unread)
+    return True
+
+
+def mark_messages_read(application, user_id, messages, marks=None):
+    # Отмечает прочитанными входящие сообщения из списка
+    incoming = [msg.id for msg in messages if msg.sender_id != user_id]
+    if not incoming:
+        return False
+    return mark_conversation_read(application, user_id, max(incoming), marks)
+
+
+def message_dicts(application, messages, user_id, marks):
+    # is_read — дошла ли до сообщения отметка прочтения получателя
+    participants = (application.user_id, application.project.creator_id)
+    messages_data = []
+    for msg in messages:
+        recipient = participants[1] if msg.sender_id == participants[0] else participants[0]
+        msg_dict = msg.to_dict()
+        msg_dict['is_read'] = msg.id <= last_read_id(marks, recipient)
+        msg_dict['is_my_message'] = (msg.sender_id == user_id)
+        messages_data.append(msg_dict)
+    return messages_data
+
+
+def load_message_window(application_id, before_id=None, limit=None):
+    # Последние limit сообщений (до before_id) по индексу (application_id, id),
+    # возвращаются в хронологическом порядке вместе с признаком "есть ещё"
+    limit = limit or current_app.config.get('CHAT_PAGE_SIZE', 50)
+    query = Message.query.options(*CHAT_MESSAGES).filter_by(application_id=application_id)
+    if before_id:
+        query = query.filter(Message.id < before_id)
+
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    return list(reversed(messages[:limit])), has_more
+
+
+def user_conversations(user_id):
+    # Один запрос по индексам (applicant_id / creator_id, last_message_at)
+    return Conversation.query \
+        .options(joinedload(Conversation.project),
+                 joinedload(Conversation.applicant),
+                 joinedload(Conversation.creator)) \
+        .filter(or_(Conversation.applicant_id == user_id,
+                    Conversation.creator_id == user_id)) \
+        .order_by(Conversation.last_message_at.desc()) \
+        .all()
+
+
+def delete_conversations(condition):
+    # condition — условие на Conversation (по заявке или по проекту целиком).
+    # Непрочитанные сообщения удаляемых диалогов больше не должны учитываться в счётчиках:
+    # суммы по каждому участнику считаются одним запросом на сторону диалога
+    for user_column, unread_column in ((Conversation.applicant_id, Conversation.applicant_unread),
+                                       (Conversation.creator_id, Conversation.creator_unread)):
+        rows = db.session.query(user_column, func.sum(unread_column)) \
+            .filter(condition, unread_column > 0) \
+            .group_by(user_column).all()
+        for user_id, unread in rows:
+            change_unread_counter(user_id, -unread)
+
+    Conversation.query.filter(condition).delete(synchronize_session=False)
+
+
+def rebuild_conversations(commit=True):
+    # Полный пересчёт сводок по таблице сообщений. commit=False — внутри миграции:
+    # фиксирует её upgrade() одной транзакцией вместе с записью schema_migration
+    Conversation.query.delete()
+
+    rows = db.session.query(Application, Project) \
+        .join(Project, Application.project_id == Project.id) \
+        .filter(Project.status != PROJECT_DELETED).all()
+
+    for application, project in rows:
+        conversation = open_conversation(application, project)
+
+        last_message = Message.query.filter_by(application_id=application.id) \
+            .order_by(Message.created_at.desc(), Message.id.desc()).first()
+        if last_message:
+            conversation.last_message_id = last_message.id
+            conversation.last_message_text = last_message.content
+            conversation.last_message_at = last_message.created_at
+
+        marks = get_read_marks(application.id)
+        conversation.applicant_unread = count_unread(
+            application.id, application.user_id, last_read_id(marks, application.user_id))
+        conversation.creator_unread = count_unread(
+            application.id, project.creator_id, last_read_id(marks, project.creator_id))
+
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return len(rows)
+
+
+def rebuild_unread_counters(commit=True):
+    # Сверка счётчиков с отметками прочтения: получатель сообщения —
+    # тот участник заявки, который его не отправлял. commit=False — внутри миграции
+    recipient = case(
+        (Message.sender_id == Application.user_id, Project.creator_id),
+        else_=Application.user_id
+    )
+    rows = db.session.query(recipient, func.count(Message.id)) \
+        .join(Application, Message.application_id == Application.id) \
+        .join(Project, Application.project_id == Project.id) \
+        .outerjoin(ReadMark, and_(ReadMark.application_id == Message.application_id,
+                                  ReadMark.user_id == recipient)) \
+        .filter(Message.id > func.coalesce(ReadMark.last_read_id, 0),
+                Project.status != PROJECT_DELETED) \
+        .group_by(recipient).all()
+
+    UnreadCounter.query.delete()
+    for user_id, count in rows:
+        db.session.add(UnreadCounter(user_id=user_id, count=count))
+
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return len(rows)
@@ -1,11 +1,28 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 
+# Связь пользователь ↔ навык (нормализованный индекс навыков из User.skills)
+user_skill = db.Table(
+    'user_skill',
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('skill_id', db.Integer, db.ForeignKey('skill.id'), primary_key=True),
+    db.Index('ix_user_skill_skill', 'skill_id', 'user_id')
+)
+
+
+class Skill(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)  # в нижнем регистре
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -19,8 +36,17 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.Text)  # ДЛЯ РЕДАКТИРОВАНИЯ ПРОФИЛЯ
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_user_created', 'created_at'),
+    )
+
     projects = db.relationship('Project', backref='creator', lazy=True)
     applications = db.relationship('Application', backref='applicant', lazy=True)
+    skill_items = db.relationship('Skill', secondary=user_skill, lazy=True)
+
+
+# Статус мягко удалённого проекта: он скрыт сразу, а строки удаляет фоновая очистка
+PROJECT_DELETED = 'deleted'
 
 
 class Project(db.Model):
@@ -37,8 +63,35 @@ class Project(db.Model):
     estimated_duration = db.Column(db.String(100))
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Версия страницы проекта для ETag/Last-Modified
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_project_creator', 'creator_id'),
+        db.Index('ix_project_status_created', 'status', 'created_at'),
+    )
 
     applications = db.relationship('Application', backref='project', lazy=True)
+    roles = db.relationship('ProjectRole', backref='project', lazy=True,
+                            order_by='ProjectRole.position', cascade='all, delete-orphan')
+
+
+class ProjectRole(db.Model):
+    # Требуемая роль проекта, разобранная из текста needed_roles при сохранении
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    position = db.Column(db.Integer, default=0, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    level = db.Column(db.String(50), default='любой')
+
+    __table_args__ = (
+        db.Index('ix_project_role_project', 'project_id', 'position'),
+        db.Index('ix_project_role_name', 'name', 'project_id'),
+    )
+
+    @property
+    def full(self):
+        return f"{self.name} ({self.level})"
 
 
 class Application(db.Model):
@@ -50,16 +103,25 @@ class Application(db.Model):
     status = db.Column(db.String(50), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Одна заявка пользователя на проект; индекс покрывает и выборку по project_id
+        db.Index('uq_application_project_user', 'project_id', 'user_id', unique=True),
+        db.Index('ix_application_user', 'user_id'),
+    )
+
 
 class Message(db.Model):
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_message_application_id', 'application_id', 'id'),
+        {'extend_existing': True}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_read = db.Column(db.Boolean, default=False)  # КРИТИЧЕСКОЕ ПОЛЕ!
+    is_read = db.Column(db.Boolean, default=False)  # Больше не обновляется: прочтение хранит ReadMark
 
     application = db.relationship('Application', backref='messages')
     sender = db.relationship('User', foreign_keys=[sender_id])
@@ -73,4 +135,64 @@ class Message(db.Model):
             'created_at': self.created_at.strftime('%H:%M %d.%m.%Y') if self.created_at else '',
             'is_read': self.is_read,
             'is_my_message': False
-        }
\ No newline at end of file
+        }
+
+class Conversation(db.Model):
+    # Сводка по диалогу: одна строка на заявку, обновляется при отправке и прочтении сообщений
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    applicant_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer)
+    last_message_text = db.Column(db.Text)
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
+    applicant_unread = db.Column(db.Integer, default=0, nullable=False)
+    creator_unread = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_conversation_applicant_activity', 'applicant_id', 'last_message_at'),
+        db.Index('ix_conversation_creator_activity', 'creator_id', 'last_message_at'),
+    )
+
+    application = db.relationship('Application')
+    project = db.relationship('Project')
+    applicant = db.relationship('User', foreign_keys=[applicant_id])
+    creator = db.relationship('User', foreign_keys=[creator_id])
+
+    def unread_for(self, user_id):
+        return self.applicant_unread if user_id == self.applicant_id else self.creator_unread
+
+
+class ReadMark(db.Model):
+    # Отметка прочтения: последнее прочитанное участником сообщение заявки.
+    # Непрочитанные — сообщения собеседника с id больше отметки (индекс message (application_id, id))
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_read_id = db.Column(db.Integer, default=0, nullable=False)
+
+
+class UnreadCounter(db.Model):
+    # Общее число непрочитанных сообщений пользователя (для значка в навигации)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+
+class PlatformStat(db.Model):
+    # Счётчики платформы для главной страницы (поддерживаются инкрементально)
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchemaMigration(db.Model):
+    # Применённые миграции схемы (см. migrations.py)
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def upsert(model):
+    # INSERT ... ON CONFLICT DO UPDATE: одна атомарная запись вместо get-then-insert,
+    # который падает с IntegrityError, если строку параллельно вставил другой запрос
+    insert = pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    return insert(model)
@@ -0,0 +1,150 @@
+import threading
+import time
+from flask import has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool, NullPool
+
+
+# Пул соединений с БД: размеры из переменных окружения, режим pgbouncer
+# (пулом управляет pgbouncer, приложение соединения не держит) и таймаут
+# SQL-запросов для веб-запросов. Пулы считают ожидание соединения —
+# /api/pool-stats показывает, хватает ли пула под опросы чата.
+# Статистика своя в каждом процессе gunicorn.
+
+
+class CheckoutStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, wait, checked_out=None, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            if checked_out is not None:
+                self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def as_dict(self):
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': round(self.wait_total / waits * 1000, 3) if waits else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'wait_total_ms': round(self.wait_total * 1000, 3),
+                'peak_checked_out': self.peak_checked_out,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    # Время от запроса соединения до выдачи: ожидание свободного соединения или подключение
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            self.checkout_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.checkout_stats.record(time.perf_counter() - started, self.checkedout())
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+
+class TimedNullPool(NullPool):
+    # Режим pgbouncer: каждое соединение новое, ожидание — это время подключения к pgbouncer
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        connection = super()._do_get()
+        self.checkout_stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+
+def engine_options(database_url, config):
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # Flask-SQLAlchemy сам ставит StaticPool для базы в памяти
+        return {}
+
+    if config['DB_PGBOUNCER']:
+        # pgbouncer в режиме transaction pooling: держать соединения в приложении незачем,
+        # а проверка pre_ping только добавила бы запрос на каждое соединение
+        return {'poolclass': TimedNullPool}
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        # После перезапуска Postgres мёртвые соединения отбрасываются до выдачи
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def _set_statement_timeout(timeout):
+    def on_begin(conn):
+        # Только для веб-запросов: команды обслуживания (purge-deleted, rebuild-*) работают дольше.
+        # SET LOCAL действует до конца транзакции — совместимо с pgbouncer (transaction pooling)
+        # и не попадает в счётчик query_budget, потому что идёт мимо событий SQLAlchemy
+        if has_request_context():
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"SET LOCAL statement_timeout = {int(timeout)}")
+            finally:
+                cursor.close()
+    return on_begin
+
+
+def init_db_pool(app, db):
+    timeout = app.config['DB_STATEMENT_TIMEOUT']
+    with app.app_context():
+        for engine in db.engines.values():
+            if timeout and engine.dialect.name == 'postgresql':
+                event.listen(engine, 'begin', _set_statement_timeout(timeout))
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'utilization': round(pool.checkedout() / capacity, 3) if capacity else None,
+        })
+    checkout_stats = getattr(pool, 'checkout_stats', None)
+    if checkout_stats is not None:
+        stats.update(checkout_stats.as_dict())
+    return stats
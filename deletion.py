@@ -0,0 +1,86 @@
+from flask import current_app
+from sqlalchemy import select
+from database import db, Project, ProjectRole, Application, Message, Conversation, ReadMark, PROJECT_DELETED
+from conversations import delete_conversations
+from search_index import remove_project
+
+
+# Удаление проектов и заявок множественными DELETE с подзапросами — без загрузки
+# заявок и сообщений в сессию. Мягкое удаление скрывает проект сразу, а сообщения
+# удаляет порциями purge_deleted_projects (команда purge-deleted по расписанию).
+# Функции, кроме очистки, не делают commit.
+
+def visible_projects():
+    return Project.query.filter(Project.status != PROJECT_DELETED)
+
+
+def get_project_or_404(project_id, *options):
+    return visible_projects().options(*options).filter(Project.id == project_id).first_or_404()
+
+
+def get_application_or_404(application_id, *options):
+    # Заявки мягко удалённого проекта недоступны, пока их не удалит очистка
+    return Application.query.options(*options) \
+        .join(Project, Application.project_id == Project.id) \
+        .filter(Application.id == application_id, Project.status != PROJECT_DELETED) \
+        .first_or_404()
+
+
+def project_application_ids(project_id):
+    return select(Application.id).where(Application.project_id == project_id)
+
+
+def soft_delete_project(project):
+    # Проект исчезает из списков, поиска и чатов сразу; сообщения и заявки остаются до очистки
+    project.status = PROJECT_DELETED
+    delete_conversations(Conversation.project_id == project.id)
+    remove_project(project.id)
+
+
+def delete_project_rows(project_id):
+    delete_conversations(Conversation.project_id == project_id)
+    Message.query.filter(Message.application_id.in_(project_application_ids(project_id))) \
+        .delete(synchronize_session=False)
+    ReadMark.query.filter(ReadMark.application_id.in_(project_application_ids(project_id))) \
+        .delete(synchronize_session=False)
+    Application.query.filter_by(project_id=project_id).delete(synchronize_session=False)
+    ProjectRole.query.filter_by(project_id=project_id).delete(synchronize_session=False)
+    remove_project(project_id)
+    Project.query.filter_by(id=project_id).delete(synchronize_session=False)
+
+
+def delete_application_rows(application_id):
+    delete_conversations(Conversation.application_id == application_id)
+    Message.query.filter_by(application_id=application_id).delete(synchronize_session=False)
+    ReadMark.query.filter_by(application_id=application_id).delete(synchronize_session=False)
+    Application.query.filter_by(id=application_id).delete(synchronize_session=False)
+
+
+def purge_message_batch(project_id, batch_size):
+    batch = select(Message.id) \
+        .where(Message.application_id.in_(project_application_ids(project_id))) \
+        .limit(batch_size)
+    return Message.query.filter(Message.id.in_(batch)).delete(synchronize_session=False)
+
+
+def purge_deleted_projects(batch_size=None, limit=None):
+    # Каждая порция — отдельная транзакция, чтобы не держать блокировки на всё время очистки
+    batch_size = batch_size or current_app.config['PURGE_BATCH_SIZE']
+    query = db.session.query(Project.id).filter(Project.status == PROJECT_DELETED).order_by(Project.id)
+    if limit:
+        query = query.limit(limit)
+    project_ids = [project_id for (project_id,) in query.all()]
+
+    messages = 0
+    for project_id in project_ids:
+        while True:
+            deleted = purge_message_batch(project_id, batch_size)
+            db.session.commit()
+            messages += deleted
+            if deleted < batch_size:
+                break
+
+        delete_project_rows(project_id)
+        db.session.commit()
+
+    return len(project_ids), messages
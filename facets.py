@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from sqlalchemy import func
+from database import db, User, Project, ProjectRole
+from skills import skill_facets
+
+
+# Кэш списков для фильтров (ВУЗы, категории, навыки) вместе с количеством записей.
+# Сбрасывается в маршрутах, которые меняют пользователей и проекты. Другие воркеры
+# gunicorn узнают об изменениях через TTL.
+
+FACET_CACHE_TTL = int(os.environ.get('FACET_CACHE_TTL', 300))
+
+
+def _grouped(column, *filters):
+    rows = db.session.query(column, func.count()) \
+        .filter(column.isnot(None), column != '', *filters) \
+        .group_by(column) \
+        .order_by(column) \
+        .all()
+    return [(value, count) for value, count in rows]
+
+
+FACET_LOADERS = {
+    'universities': lambda: _grouped(User.university),
+    'skills': lambda: [(name, count) for name, count in skill_facets()],
+    'project_categories': lambda: _grouped(Project.category, Project.status == 'active'),
+    'project_universities': lambda: _grouped(Project.university_filter, Project.status == 'active'),
+    'project_roles': lambda: [
+        (name, count) for name, count in db.session.query(ProjectRole.name, func.count())
+        .join(Project, ProjectRole.project_id == Project.id)
+        .filter(Project.status == 'active')
+        .group_by(ProjectRole.name).order_by(ProjectRole.name)
+    ],
+}
+
+USER_FACETS = ('universities', 'skills')
+PROJECT_FACETS = ('project_categories', 'project_universities', 'project_roles')
+
+
+class FacetCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._values.get(name)
+            if cached and cached[0] > now:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        value = FACET_LOADERS[name]()
+        with self._lock:
+            self._values[name] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, *names):
+        with self._lock:
+            for name in names or list(self._values):
+                self._values.pop(name, None)
+
+
+facet_cache = FacetCache(FACET_CACHE_TTL)
+
+
+def get_facet(name):
+    return facet_cache.get(name)
+
+
+def invalidate_user_facets():
+    facet_cache.invalidate(*USER_FACETS)
+
+
+def invalidate_project_facets():
+    facet_cache.invalidate(*PROJECT_FACETS)
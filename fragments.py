@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from flask import render_template
+from markupsafe import Markup
+from database import Project
+from load_profiles import PROJECT_CARD
+
+
+# Кэш отрисованных фрагментов проекта: карточки в /projects и /search, основная часть
+# и блок автора на странице проекта. Ключ — (вид, id проекта, project.updated_at):
+# правка проекта (и ВУЗа/факультета автора) меняет updated_at, поэтому другие воркеры
+# gunicorn не отдадут устаревший HTML. Части, зависящие от пользователя (заявка,
+# кнопки автора), в кэш не попадают.
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2000))
+
+
+class FragmentCache:
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._fragments[key] = html
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+
+    def invalidate_project(self, project_id):
+        with self._lock:
+            for key in [key for key in self._fragments if key[1] == project_id]:
+                del self._fragments[key]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._fragments)}
+
+
+fragment_cache = FragmentCache(FRAGMENT_CACHE_SIZE)
+
+
+def fragment_key(kind, project):
+    return kind, project.id, project.updated_at
+
+
+def render_fragment(kind, template, project):
+    key = fragment_key(kind, project)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(render_template(template, project=project))
+        fragment_cache.set(key, html)
+    return html
+
+
+def render_project_cards(kind, template, projects):
+    # Роли и автора загружаем одним запросом и только для карточек, которых нет в кэше
+    cards = {}
+    missing = []
+    for project in projects:
+        html = fragment_cache.get(fragment_key(kind, project))
+        if html is None:
+            missing.append(project)
+        else:
+            cards[project.id] = html
+
+    if missing:
+        Project.query.options(*PROJECT_CARD) \
+            .filter(Project.id.in_([project.id for project in missing])) \
+            .populate_existing().all()
+        for project in missing:
+            html = Markup(render_template(template, project=project))
+            fragment_cache.set(fragment_key(kind, project), html)
+            cards[project.id] = html
+
+    return [cards[project.id] for project in projects]
+
+
+def invalidate_project_fragments(project_id):
+    fragment_cache.invalidate_project(project_id)
@@ -0,0 +1,8 @@
+# Настройки gunicorn, которые нельзя задать в командной строке (читается автоматически)
+
+
+def post_fork(server, worker):
+    # Пул хэширования паролей — пока воркер однопоточный (с --preload настройки
+    # PASSWORD_HASH_* уже применены в мастер-процессе)
+    from passwords import password_hasher
+    password_hasher.start()
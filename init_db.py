@@ -1,5 +1,7 @@
-from app import app, db
+from app import create_app, bootstrap_database
+
+app = create_app()
 
 with app.app_context():
-    db.create_all()
-    print("База данных инициализирована!")
\ No newline at end of file
+    bootstrap_database()
+    print("База данных инициализирована!")
@@ -0,0 +1,27 @@
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+from database import Project, Application, Message
+
+# backref-атрибуты (Project.creator, Application.project, ...) появляются
+# только после настройки мапперов
+configure_mappers()
+
+
+# Профили загрузки связей для маршрутов: всё, к чему обращается шаблон,
+# загружается заранее фиксированным числом запросов, без ленивых SELECT на каждую запись.
+
+# Карточки проектов (/projects, /search), которых нет в кэше фрагментов
+PROJECT_CARD = (joinedload(Project.creator), selectinload(Project.roles))
+
+# /profile: счётчик заявок на проектах пользователя и проекты его заявок
+PROFILE_PROJECTS = (selectinload(Project.applications),)
+PROFILE_APPLICATIONS = (joinedload(Application.project),)
+
+# /project/<id>/applications: данные соискателей
+PROJECT_APPLICATIONS = (joinedload(Application.applicant),)
+
+# Чат: заявка вместе с проектом, автором проекта и соискателем; сообщения с отправителями
+CHAT_APPLICATION = (
+    joinedload(Application.project).joinedload(Project.creator),
+    joinedload(Application.applicant),
+)
+CHAT_MESSAGES = (joinedload(Message.sender),)
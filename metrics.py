@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from flask import g, request
+from chat_hub import chat_hub
+from db_pool import pool_stats
+from facets import facet_cache
+from fragments import fragment_cache
+from user_cache import user_cache
+
+
+# Метрики для /metrics: число запросов и гистограммы времени ответа по эндпоинтам,
+# пулы соединений, кэши, открытые потоки чата. Каждый процесс gunicorn считает своё
+# и раз в METRICS_FLUSH_SECONDS записывает снимок в METRICS_DIR/<pid>-<время старта>.json;
+# /metrics складывает снимки всех воркеров. Счётчики (_total, гистограммы) суммируются
+# по всем файлам, в том числе завершившихся воркеров, — иначе после перезапуска
+# воркера они бы уменьшались. Текущие значения (gauge) — только живых процессов.
+# Время старта в имени файла: новый процесс с тем же pid не затрёт снимок старого.
+
+# Границы корзин гистограммы, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_TYPES = {
+    'colab_http_requests_total': ('counter', 'Запросы по эндпоинту, методу и статусу'),
+    'colab_http_request_duration_seconds': ('histogram', 'Время ответа по эндпоинту'),
+    'colab_http_requests_in_flight': ('gauge', 'Запросы в обработке (опросы чата, SSE)'),
+    'colab_chat_streams': ('gauge', 'Открытые SSE-потоки чата'),
+    'colab_db_pool_checked_out': ('gauge', 'Занятые соединения пула'),
+    'colab_db_pool_size': ('gauge', 'Размер пула соединений'),
+    'colab_db_pool_checkouts_total': ('counter', 'Выдачи соединений из пула'),
+    'colab_db_pool_timeouts_total': ('counter', 'Таймауты ожидания соединения'),
+    'colab_db_pool_wait_seconds_total': ('counter', 'Суммарное ожидание соединения'),
+    'colab_cache_hits_total': ('counter', 'Попадания в кэш'),
+    'colab_cache_misses_total': ('counter', 'Промахи кэша'),
+    'colab_cache_hit_ratio': ('gauge', 'Доля попаданий в кэш'),
+    'colab_cache_entries': ('gauge', 'Записей в кэше'),
+    'colab_workers': ('gauge', 'Живые процессы с метриками'),
+}
+
+
+def process_started(pid):
+    # Время старта процесса из /proc (в тиках с загрузки системы); вне Linux — None
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Имя процесса в скобках может содержать пробелы; starttime — 22-е поле
+    return int(stat.rsplit(')', 1)[1].split()[19])
+
+
+def process_alive(pid, started):
+    # Жив именно тот процесс, что записал снимок, а не новый с тем же pid
+    if os.path.isdir('/proc'):
+        return process_started(pid) == started
+    if os.name == 'nt':
+        # os.kill(pid, 0) в Windows завершает процесс; локально считаем всех живыми
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsCollector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.directory = None
+        self.flush_seconds = 5
+        self.app = None
+        self.db = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Без /proc — время запуска по часам: имя файла всё равно уникально
+        self._started = process_started(self._pid) or time.time_ns()
+        self._requests = Counter()
+        self._buckets = {}
+        self._sums = Counter()
+        self._in_flight = Counter()
+        self._flushed_at = 0.0
+        self._pending = None
+
+    def _check_fork(self):
+        # После fork (gunicorn --preload) у воркера свои счётчики и свой файл
+        if self._pid != os.getpid():
+            self._reset()
+
+    def started(self, endpoint):
+        with self._lock:
+            self._check_fork()
+            self._in_flight[endpoint] += 1
+
+    def finished(self, endpoint, method, status, duration):
+        with self._lock:
+            self._check_fork()
+            self._in_flight[endpoint] -= 1
+            self._requests[(endpoint, method, str(status))] += 1
+            buckets = self._buckets.setdefault(endpoint, [0] * (len(BUCKETS) + 1))
+            buckets[bisect_left(BUCKETS, duration)] += 1
+            self._sums[endpoint] += duration
+
+    def samples(self):
+        # Снимок процесса: списки [имя, метки, значение] для счётчиков и текущих значений
+        counters, gauges = [], []
+        with self._lock:
+            self._check_fork()
+            for (endpoint, method, status), count in self._requests.items():
+                counters.append(['colab_http_requests_total',
+                                 {'endpoint': endpoint, 'method': method, 'status': status}, count])
+            for endpoint, buckets in self._buckets.items():
+                total = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), buckets):
+                    total += count
+                    counters.append(['colab_http_request_duration_seconds_bucket',
+                                     {'endpoint': endpoint, 'le': str(bound)}, total])
+                counters.append(['colab_http_request_duration_seconds_sum', {'endpoint': endpoint},
+                                 self._sums[endpoint]])
+                counters.append(['colab_http_request_duration_seconds_count', {'endpoint': endpoint}, total])
+            for endpoint, count in self._in_flight.items():
+                gauges.append(['colab_http_requests_in_flight', {'endpoint': endpoint}, count])
+
+        gauges.append(['colab_chat_streams', {}, chat_hub.active_streams()])
+        gauges.append(['colab_workers', {}, 1])
+
+        for key, engine in self.db.engines.items():
+            labels = {'pool': key or 'primary'}
+            stats = pool_stats(engine)
+            gauges.append(['colab_db_pool_checked_out', labels, stats.get('checked_out', 0)])
+            gauges.append(['colab_db_pool_size', labels, stats.get('size', 0)])
+            counters.append(['colab_db_pool_checkouts_total', labels, stats.get('checkouts', 0)])
+            counters.append(['colab_db_pool_timeouts_total', labels, stats.get('timeouts', 0)])
+            counters.append(['colab_db_pool_wait_seconds_total', labels, stats.get('wait_total_ms', 0) / 1000])
+
+        caches = {'users': user_cache.stats(), 'fragments': fragment_cache.stats(),
+                  'facets': {'hits': facet_cache.hits, 'misses': facet_cache.misses}}
+        for name, stats in caches.items():
+            labels = {'cache': name}
+            counters.append(['colab_cache_hits_total', labels, stats['hits']])
+            counters.append(['colab_cache_misses_total', labels, stats['misses']])
+            if 'size' in stats:
+                gauges.append(['colab_cache_entries', labels, stats['size']])
+
+        return {'pid': self._pid, 'started': self._started, 'counters': counters, 'gauges': gauges}
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_seconds:
+            # Последние запросы перед простоем воркера тоже должны попасть в файл
+            with self._lock:
+                if self._pending is None:
+                    self._pending = threading.Timer(self.flush_seconds - (now - self._flushed_at),
+                                                    self._deferred_flush)
+                    self._pending.daemon = True
+                    self._pending.start()
+            return
+        self._flushed_at = now
+        snapshot = self.samples()
+        path = snapshot_path(self.directory, snapshot)
+        # Запись во временный файл и переименование: читатель не увидит половину файла
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(temporary, path)
+
+    def _deferred_flush(self):
+        with self._lock:
+            self._pending = None
+        with self.app.app_context():
+            self.flush(force=True)
+
+
+metrics_collector = MetricsCollector()
+
+
+def snapshot_path(directory, snapshot):
+    return os.path.join(directory, f"{snapshot['pid']}-{snapshot['started']}.json")
+
+
+def snapshots(directory):
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path, encoding='utf-8') as f:
+                yield path, json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def snapshot_alive(snapshot):
+    if snapshot['pid'] == os.getpid():
+        # Свой снимок — только текущего процесса, а не прошлого с тем же pid
+        return snapshot.get('started') == metrics_collector._started
+    # Снимок старого формата (<pid>.json) без времени старта — процесс давно завершён
+    return 'started' in snapshot and process_alive(snapshot['pid'], snapshot['started'])
+
+
+def collect_metrics():
+    # Сумма снимков всех воркеров: {(имя, метки): значение}
+    metrics_collector.flush(force=True)
+    merged = Counter()
+    for _, snapshot in snapshots(metrics_collector.directory):
+        groups = [snapshot['counters']]
+        if snapshot_alive(snapshot):
+            groups.append(snapshot['gauges'])
+        for samples in groups:
+            for name, labels, value in samples:
+                merged[(name, tuple(sorted(labels.items())))] += value
+
+    # Доля попаданий считается по сумме, а не как среднее долей воркеров
+    for (name, labels), hits in list(merged.items()):
+        if name == 'colab_cache_hits_total':
+            lookups = hits + merged[('colab_cache_misses_total', labels)]
+            merged[('colab_cache_hit_ratio', labels)] = round(hits / lookups, 4) if lookups else 0.0
+    return merged
+
+
+def metric_family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRIC_TYPES:
+            return name[:-len(suffix)]
+    return name
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(merged):
+    # Сортировка устойчивая: корзины гистограммы остаются в порядке возрастания границ
+    lines, described = [], set()
+    for name, labels in sorted(merged, key=lambda key: (metric_family(key[0]), key[0])):
+        family = metric_family(name)
+        if family not in described:
+            described.add(family)
+            kind, help_text = METRIC_TYPES[family]
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+        label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+        lines.append(f'{name}{{{label_text}}} {merged[(name, labels)]}' if label_text
+                     else f'{name} {merged[(name, labels)]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_json(merged):
+    result = {}
+    for (name, labels), value in sorted(merged.items()):
+        result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+    return result
+
+
+def init_metrics(app, db):
+    if not app.config.get('METRICS'):
+        return
+
+    metrics_collector.app = app
+    metrics_collector.db = db
+    metrics_collector.flush_seconds = app.config['METRICS_FLUSH_SECONDS']
+    metrics_collector.directory = app.config['METRICS_DIR']
+    os.makedirs(metrics_collector.directory, exist_ok=True)
+    # Снимки процессов прошлого запуска; файлы живых соседей-воркеров не трогаем
+    for path, snapshot in list(snapshots(metrics_collector.directory)):
+        if not snapshot_alive(snapshot):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or '<unmatched>'
+        metrics_collector.started(g.metrics_endpoint)
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        # teardown вызывается всегда, в том числе после исключения; для SSE — когда поток закрыт
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        status = g.get('metrics_status', 500)
+        metrics_collector.finished(g.metrics_endpoint, request.method, status, time.perf_counter() - started)
+        metrics_collector.flush()
@@ -0,0 +1,184 @@
+from sqlalchemy import text, func, case, and_, select, insert, inspect
+from database import db, Application, Project, Message, Conversation, ReadMark, SchemaMigration
+from conversations import rebuild_conversations, rebuild_unread_counters
+from roles import backfill_project_roles
+from stats import refresh_stats, seed_stats, STAT_NAMES
+from conditional import PROJECTS_VERSION
+from search_index import is_postgres
+
+
+# Версионированные миграции схемы. Новые таблицы создаёт db.create_all(),
+# а изменения существующих таблиц (индексы, данные) описываются здесь.
+# Каждая миграция выполняется один раз и записывается в schema_migration
+# в той же транзакции, поэтому сама миграция и вызываемые ею функции не делают commit.
+
+MIGRATIONS = []
+
+# Ключ advisory-блокировки Postgres: миграции разных процессов выполняются по очереди
+MIGRATION_LOCK_ID = 815001
+
+# Столбцы, добавленные в существующие таблицы. Создаются сразу после create_all(),
+# до миграций данных: те читают модели целиком, вместе с новыми столбцами
+NEW_COLUMNS = [
+    ('project', 'updated_at', 'TIMESTAMP'),
+]
+
+
+def migration(version, name):
+    def decorator(apply):
+        MIGRATIONS.append((version, name, apply))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return apply
+    return decorator
+
+
+def execute(sql):
+    db.session.execute(text(sql))
+
+
+def add_missing_columns():
+    # Новые базы получают столбцы из db.create_all(), существующие — через ALTER TABLE
+    inspector = inspect(db.session.connection())
+    for table, column, ddl in NEW_COLUMNS:
+        if column not in {c['name'] for c in inspector.get_columns(table)}:
+            execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+    db.session.commit()
+
+
+# ---------- МИГРАЦИИ ----------
+
+@migration(1, 'Индексы для горячих маршрутов')
+def add_hot_path_indexes():
+    execute("CREATE INDEX IF NOT EXISTS ix_message_application_id ON message (application_id, id)")
+    execute("CREATE INDEX IF NOT EXISTS ix_application_user ON application (user_id)")
+    execute("CREATE INDEX IF NOT EXISTS ix_project_creator ON project (creator_id)")
+    execute("CREATE INDEX IF NOT EXISTS ix_project_status_created ON project (status, created_at)")
+
+
+@migration(2, 'Уникальная заявка (project_id, user_id)')
+def add_unique_application():
+    # Повторные заявки объединяем с самой ранней: переносим сообщения, затем удаляем дубли
+    duplicates = db.session.query(Application.project_id, Application.user_id, func.min(Application.id)) \
+        .group_by(Application.project_id, Application.user_id) \
+        .having(func.count(Application.id) > 1).all()
+
+    for project_id, user_id, keep_id in duplicates:
+        extra_ids = [a.id for a in Application.query.filter(
+            Application.project_id == project_id,
+            Application.user_id == user_id,
+            Application.id != keep_id
+        )]
+        Message.query.filter(Message.application_id.in_(extra_ids)) \
+            .update({'application_id': keep_id}, synchronize_session=False)
+        Conversation.query.filter(Conversation.application_id.in_(extra_ids)) \
+            .delete(synchronize_session=False)
+        Application.query.filter(Application.id.in_(extra_ids)).delete(synchronize_session=False)
+
+    execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_application_project_user ON application (project_id, user_id)")
+
+    if duplicates:
+        db.session.flush()
+        rebuild_conversations(commit=False)
+        rebuild_unread_counters(commit=False)
+
+
+@migration(3, 'Заполнение сводок диалогов и счётчиков непрочитанного')
+def backfill_chat_summaries():
+    if Application.query.first() is not None and Conversation.query.first() is None:
+        rebuild_conversations(commit=False)
+        rebuild_unread_counters(commit=False)
+
+
+@migration(4, 'Индекс для курсорной пагинации студентов')
+def add_user_created_index():
+    execute('CREATE INDEX IF NOT EXISTS ix_user_created ON "user" (created_at)')
+
+
+@migration(5, 'Разбор needed_roles в таблицу project_role')
+def backfill_roles():
+    backfill_project_roles(commit=False)
+
+
+@migration(6, 'Отметки прочтения вместо Message.is_read')
+def backfill_read_marks():
+    # Отметка участника — перед первым непрочитанным входящим сообщением,
+    # а если таких нет — последнее сообщение заявки
+    if ReadMark.query.first() is not None:
+        return
+
+    sides = (
+        (Application.user_id, Message.sender_id != Application.user_id),
+        (Project.creator_id, Message.sender_id == Application.user_id),
+    )
+    for user_id, incoming in sides:
+        first_unread = func.min(case((and_(Message.is_read == False, incoming), Message.id)))
+        watermark = func.coalesce(first_unread - 1, func.max(Message.id), 0)
+        rows = select(Application.id, user_id, watermark) \
+            .join(Project, Application.project_id == Project.id) \
+            .outerjoin(Message, Message.application_id == Application.id) \
+            .group_by(Application.id, user_id)
+        db.session.execute(insert(ReadMark).from_select(['application_id', 'user_id', 'last_read_id'], rows))
+
+    # Сводки и счётчики теперь считаются от отметок
+    if Application.query.first() is not None:
+        rebuild_conversations(commit=False)
+        rebuild_unread_counters(commit=False)
+
+
+@migration(7, 'Время изменения проекта для условных ответов')
+def backfill_project_updated_at():
+    execute("UPDATE project SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+@migration(8, 'Заполнение счётчиков платформы')
+def backfill_platform_stats():
+    # Без строк счётчиков первый increment_stat начал бы отсчёт с нуля
+    refresh_stats()
+
+
+@migration(9, 'Строки всех счётчиков и индекс ВУЗов')
+def seed_platform_stats():
+    # Счётчики, которых нет в миграции 8 (версия списка проектов для условных ответов)
+    seed_stats(STAT_NAMES + (PROJECTS_VERSION,))
+    execute('CREATE INDEX IF NOT EXISTS ix_user_university ON "user" (university)')
+
+
+# ---------- ПРИМЕНЕНИЕ ----------
+
+def applied_versions():
+    return {m.version for m in SchemaMigration.query.all()}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def lock_migrations():
+    # Блокировка до конца транзакции. SQLite сам сериализует запись в файл базы
+    if is_postgres():
+        execute(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})")
+
+
+def upgrade():
+    db.create_all()
+    add_missing_columns()
+
+    applied = []
+    for version, name, apply in pending_migrations():
+        try:
+            lock_migrations()
+            # Пока ждали блокировку, миграцию мог применить другой процесс
+            if db.session.get(SchemaMigration, version) is not None:
+                db.session.rollback()
+                continue
+            apply()
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+            applied.append((version, name))
+        except Exception:
+            # Ошибка миграции (нарушение ограничения в данных и т.п.) — не «применена
+            # другим процессом»: откатываем и останавливаем обновление
+            db.session.rollback()
+            raise
+    return applied
@@ -0,0 +1,137 @@
+import base64
+import json
+from datetime import datetime
+from flask import request, url_for
+from sqlalchemy import and_, or_
+
+
+# Курсорная (keyset) пагинация: вместо OFFSET следующая страница выбирается условием
+# "строго после последней записи" по ключу сортировки, поэтому стоимость страницы
+# не зависит от её номера. Курсор — непрозрачный токен base64(JSON).
+
+class CursorPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'k': [_dump(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None, 'next'
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = 'prev' if payload.get('d') == 'prev' else 'next'
+        return [_load(v) for v in payload['k']], direction
+    except (ValueError, KeyError, TypeError):
+        # Испорченный курсор — показываем первую страницу
+        return None, 'next'
+
+
+def _matches(sort_keys, values):
+    # Значения из курсора должны подходить к ключу сортировки: иначе подделанный
+    # курсор ({"k":[null,null]}, списки, объекты) дойдёт до SQL и даст 500
+    if len(values) != len(sort_keys):
+        return False
+    for (column, _), value in zip(sort_keys, values):
+        expected = column.type.python_type
+        # JSON не различает 1.0 и 1, а bool в Python — подкласс int
+        allowed = (int, float) if expected is float else expected
+        if isinstance(value, bool) or not isinstance(value, allowed):
+            return False
+    return True
+
+
+def _after(sort_keys, values):
+    # (a, b) > (x, y) в порядке сортировки, развёрнуто в OR/AND, чтобы работали индексы
+    conditions = []
+    for i, ((column, descending), value) in enumerate(zip(sort_keys, values)):
+        step = column < value if descending else column > value
+        equal = [col == val for (col, _), val in zip(sort_keys[:i], values[:i])]
+        conditions.append(and_(*equal, step) if equal else step)
+    return or_(*conditions)
+
+
+def _reversed(sort_keys):
+    return [(column, not descending) for column, descending in sort_keys]
+
+
+def _order(sort_keys):
+    return [column.desc() if descending else column.asc() for column, descending in sort_keys]
+
+
+def paginate_keyset(query, sort_keys, per_page, cursor=None, key=None, entity=None):
+    """Страница запроса query по ключу sort_keys — списку пар (выражение, по убыванию).
+
+    key(row) возвращает значения ключа для строки результата; по умолчанию берутся
+    атрибуты с именами выражений. entity(row) достаёт объект для шаблона, если
+    запрос возвращает дополнительные столбцы (например, релевантность).
+    """
+    if key is None:
+        key = lambda item: [getattr(item, column.key) for column, _ in sort_keys]
+
+    values, direction = decode_cursor(cursor)
+    if values is not None and not _matches(sort_keys, values):
+        values, direction = None, 'next'
+
+    if direction == 'prev' and values is not None:
+        # Идём назад: берём записи перед курсором в обратном порядке и разворачиваем
+        rows = query.filter(_after(_reversed(sort_keys), values)) \
+            .order_by(*_order(_reversed(sort_keys))) \
+            .limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if values is not None:
+            query = query.filter(_after(sort_keys, values))
+        rows = query.order_by(*_order(sort_keys)).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = values is not None
+
+    next_cursor = encode_cursor(key(items[-1]), 'next') if items and has_next else None
+    prev_cursor = encode_cursor(key(items[0]), 'prev') if items and has_prev else None
+    if entity is not None:
+        items = [entity(row) for row in items]
+    return CursorPage(items, next_cursor, prev_cursor)
+
+
+def cursor_url(cursor):
+    # Ссылка на ту же страницу с другим курсором (остальные параметры сохраняются)
+    args = request.args.to_dict()
+    args.pop('page', None)
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# Хэширование паролей в отдельном пуле процессов: дорогой хэш не занимает поток
+# веб-воркера и GIL, а число одновременных хэшей ограничено — всплеск входов
+# в начале семестра не останавливает остальные страницы.
+
+DEFAULT_COSTS = {
+    'scrypt': 32768,    # параметр N
+    'pbkdf2': 600000,   # число итераций
+}
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def method_string(method, cost=None):
+    cost = cost or DEFAULT_COSTS[method]
+    if method == 'scrypt':
+        return f"scrypt:{cost}:8:1"
+    if method == 'pbkdf2':
+        return f"pbkdf2:sha256:{cost}"
+    raise ValueError(f"Неизвестный алгоритм хэширования: {method}")
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', cost=None, workers=2, timeout=10):
+        self.configure(method, cost, workers, timeout)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_COST'],
+                       app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_TIMEOUT'])
+
+    def configure(self, method, cost, workers, timeout):
+        self.method = method_string(method, cost)
+        self.workers = workers
+        self.timeout = timeout
+        # В очереди пула не больше двух задач на процесс, остальные запросы ждут слот
+        self._slots = threading.BoundedSemaphore(max(workers, 1) * 2)
+
+    def _context(self):
+        # fork безопасен, только пока в процессе один поток: иначе копия процесса может
+        # унаследовать блокировку, захваченную другим потоком, и зависнуть. В многопоточном
+        # воркере gthread — forkserver/spawn: они заново импортируют главный модуль
+        # (gunicorn, flask, app.py — без побочных эффектов при импорте)
+        methods = multiprocessing.get_all_start_methods()
+        if 'fork' in methods and threading.active_count() == 1:
+            return multiprocessing.get_context('fork')
+        if 'forkserver' in methods:
+            return multiprocessing.get_context('forkserver')
+        return multiprocessing.get_context('spawn')
+
+    def _get_pool(self):
+        # Пул создаётся в каждом процессе gunicorn отдельно — после fork старый пул не годится
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context())
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def start(self):
+        # Из post_fork gunicorn (gunicorn.conf.py): воркер ещё однопоточный, процессы пула
+        # создаются fork сразу, до потоков gthread
+        if self.workers:
+            self._get_pool().submit(int).result()
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        # Один таймаут на ожидание слота и на сам хэш
+        deadline = time.monotonic() + self.timeout
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy("Все процессы хэширования заняты")
+        try:
+            # Процесс пула упал (нехватка памяти и т.п.) — пул сломан целиком:
+            # закрываем его и повторяем один раз на новом
+            for _ in range(2):
+                pool = self._get_pool()
+                try:
+                    future = pool.submit(func, *args)
+                    return future.result(timeout=max(deadline - time.monotonic(), 0))
+                except BrokenProcessPool:
+                    self._discard(pool)
+            raise HashingBusy("Процесс хэширования аварийно завершился")
+        except FutureTimeout:
+            raise HashingBusy("Хэширование пароля не уложилось в таймаут")
+        finally:
+            self._slots.release()
+
+    def _discard(self, pool):
+        with self._lock:
+            # Пул мог уже заменить параллельный запрос
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Хэш хранит параметры перед первым '$': "scrypt:32768:8:1$соль$хэш"
+        return password_hash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
+
+
+def benchmark_logins(method, costs, logins=40, concurrency=8, workers=2):
+    # Пропускная способность входа (проверок пароля в секунду) при каждой стоимости хэша;
+    # concurrency потоков имитируют параллельные запросы к /login
+    results = []
+    for cost in costs:
+        hasher = PasswordHasher(method, cost, workers, timeout=600)
+        try:
+            password_hash = hasher.hash('benchmark-password')
+            hasher.check(password_hash, 'benchmark-password')  # прогрев пула
+
+            def timed_check(_):
+                started = time.perf_counter()
+                hasher.check(password_hash, 'benchmark-password')
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = sorted(executor.map(timed_check, range(logins)))
+            elapsed = time.perf_counter() - started
+        finally:
+            hasher.shutdown()
+
+        results.append((cost, logins / elapsed, latencies[len(latencies) // 2]))
+    return results
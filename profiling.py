@@ -0,0 +1,121 @@
+import json
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from query_budget import query_count
+
+
+# Профилирование запросов (PROFILING=1): время SQL и шаблонов в заголовке Server-Timing
+# (видно во вкладке Network браузера) и строка JSON в логе на каждый запрос.
+# Одинаковые по форме запросы, повторённые PROFILING_N_PLUS_ONE раз и больше, —
+# признак N+1: ленивая загрузка связи в цикле шаблона или маршрута.
+
+# Значения и списки IN (?, ?, ?) не влияют на форму запроса
+LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+PARAMS_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+SPACES_RE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    shape = LITERALS_RE.sub('?', statement)
+    shape = PARAMS_LIST_RE.sub('(?)', shape)
+    return SPACES_RE.sub(' ', shape).strip()
+
+
+def _profile():
+    return g.get('profile') if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['profile_started'].pop()
+    profile = _profile()
+    if profile is not None:
+        elapsed = time.perf_counter() - started
+        profile['sql_time'] += elapsed
+        profile['statements'].append((elapsed, statement))
+
+
+def _handle_error(context):
+    # Запрос с ошибкой не доходит до after_cursor_execute
+    started = context.connection.info.get('profile_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _profile()
+    if profile is not None:
+        profile['templates'].append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    profile = _profile()
+    if profile is not None and profile['templates']:
+        started = profile['templates'].pop()
+        # Время считаем только для внешнего шаблона, вложенные в нём уже учтены
+        if not profile['templates']:
+            profile['template_time'] += time.perf_counter() - started
+
+
+def repeated_statements(statements, threshold):
+    shapes = Counter(statement_shape(statement) for _, statement in statements)
+    return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+
+def init_profiling(app, db):
+    if not app.config.get('PROFILING'):
+        return
+
+    threshold = app.config['PROFILING_N_PLUS_ONE']
+    log_ms = app.config['PROFILING_LOG_MS']
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_profile():
+        g.profile = {'started': time.perf_counter(), 'sql_time': 0.0, 'statements': [],
+                     'template_time': 0.0, 'templates': []}
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+
+        total = time.perf_counter() - profile['started']
+        sql_count = query_count()
+        response.headers.add('Server-Timing', f'sql;dur={profile["sql_time"] * 1000:.1f};desc="{sql_count} SQL"')
+        response.headers.add('Server-Timing', f'tpl;dur={profile["template_time"] * 1000:.1f}')
+        response.headers.add('Server-Timing', f'total;dur={total * 1000:.1f}')
+
+        repeated = repeated_statements(profile['statements'], threshold)
+        if total * 1000 >= log_ms or repeated:
+            slowest = sorted(profile['statements'], key=lambda item: item[0], reverse=True)[:3]
+            print(json.dumps({
+                'event': 'request_profile',
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'sql_count': sql_count,
+                'sql_ms': round(profile['sql_time'] * 1000, 1),
+                'template_ms': round(profile['template_time'] * 1000, 1),
+                'slowest_sql': [{'ms': round(elapsed * 1000, 2), 'statement': statement_shape(statement)[:300]}
+                                for elapsed, statement in slowest],
+                'n_plus_one': [{'count': count, 'statement': shape[:300]} for shape, count in repeated],
+            }, ensure_ascii=False), flush=True)
+        return response
@@ -0,0 +1,83 @@
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+
+# Подсчёт SQL-запросов за запрос к приложению и бюджеты для горячих маршрутов.
+# В строгом режиме (QUERY_BUDGET_STRICT=1 или app.config['QUERY_BUDGET_STRICT'])
+# превышение бюджета — ошибка, поэтому N+1 в этих маршрутах сразу видно.
+
+# Бюджеты не зависят от объёма данных: связи загружаются жадно (joinedload/selectinload)
+QUERY_BUDGETS = {
+    'main.projects': 6,
+    'main.search_projects': 6,
+    'main.profile': 5,
+    'main.project_applications': 4,
+    'main.chat': 10,
+    'main.get_messages': 9,
+    'main.get_message_history': 4,
+}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_count():
+    return g.get('sql_query_count', 0) if has_app_context() else 0
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+
+def init_query_budget(app, db):
+    with app.app_context():
+        # Все движки, включая реплику для чтения
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def reset_query_count():
+        # g может быть общим для нескольких запросов (тестовый клиент внутри app_context)
+        g.sql_query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        budget = QUERY_BUDGETS.get(request.endpoint)
+        count = query_count()
+        if budget is not None and count > budget:
+            message = f"{request.endpoint}: {count} SQL-запросов при бюджете {budget}"
+            if app.config.get('QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+            print(f"⚠️ Превышен бюджет запросов — {message}")
+        return response
+
+
+def check_route_budgets(app, user_id, urls):
+    # Прогоняет маршруты тестовым клиентом от имени пользователя в строгом режиме.
+    # Вызывать вне app_context: иначе g и сессия общие для всех запросов
+    # и закэшированные объекты скрывают часть SQL
+    results = []
+    strict = app.config.get('QUERY_BUDGET_STRICT')
+    propagate = app.config.get('PROPAGATE_EXCEPTIONS')
+    app.config['QUERY_BUDGET_STRICT'] = True
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        for url in urls:
+            try:
+                response = client.get(url)
+                results.append((url, response.status_code, None))
+            except QueryBudgetExceeded as e:
+                results.append((url, None, str(e)))
+    finally:
+        app.config['QUERY_BUDGET_STRICT'] = strict
+        app.config['PROPAGATE_EXCEPTIONS'] = propagate
+
+    return results
@@ -0,0 +1,90 @@
+import json
+from sqlalchemy import text, or_
+from database import (db, User, Project, Application, Message, Conversation,
+                      UnreadCounter, Skill, user_skill)
+
+
+# Проверка планов запросов горячих маршрутов: EXPLAIN для каждого запроса,
+# ошибка, если встречается последовательное сканирование таблицы больше порога.
+
+def sample_id(model):
+    row = db.session.query(model.id).order_by(model.id.desc()).first()
+    return row[0] if row else 1
+
+
+def hot_queries():
+    user_id = sample_id(User)
+    project_id = sample_id(Project)
+    application_id = sample_id(Application)
+    skill_id = sample_id(Skill)
+
+    return {
+        '/projects': Project.query.filter_by(status='active')
+            .order_by(Project.created_at.desc(), Project.id.desc()).limit(10),
+        '/students': User.query.order_by(User.created_at.desc(), User.id.desc()).limit(25),
+        '/profile (проекты)': Project.query.filter_by(creator_id=user_id),
+        '/profile (заявки)': Application.query.filter_by(user_id=user_id),
+        '/project/<id>/applications': Application.query.filter_by(project_id=project_id),
+        '/project/<id> (has_applied)': Application.query.filter_by(project_id=project_id, user_id=user_id),
+        '/chat/<id>': Message.query.filter_by(application_id=application_id).order_by(Message.id.asc()),
+        'get_messages': Message.query.filter_by(application_id=application_id)
+            .filter(Message.id > 0).order_by(Message.id.asc()),
+        '/chats': Conversation.query.filter(or_(Conversation.applicant_id == user_id,
+                                                Conversation.creator_id == user_id))
+            .order_by(Conversation.last_message_at.desc()),
+        '/chat/unread_count': UnreadCounter.query.filter_by(user_id=user_id),
+        '/students?skill=': db.session.query(user_skill.c.user_id).filter(user_skill.c.skill_id == skill_id),
+    }
+
+
+def table_sizes():
+    sizes = {}
+    for table in db.metadata.sorted_tables:
+        sizes[table.name] = db.session.execute(text(f'SELECT COUNT(*) FROM "{table.name}"')).scalar()
+    return sizes
+
+
+def compile_sql(query):
+    statement = query.statement if hasattr(query, 'statement') else query
+    return str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+
+def sequential_scans(sql):
+    # Возвращает (план в виде текста, список таблиц, которые читаются целиком)
+    if db.engine.dialect.name == 'postgresql':
+        plan = db.session.execute(text('EXPLAIN (FORMAT JSON) ' + sql)).scalar()
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+        scans = []
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan':
+                scans.append(node.get('Relation Name'))
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return json.dumps(plan, ensure_ascii=False), scans
+
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+    details = [row[-1] for row in rows]
+    scans = []
+    for detail in details:
+        # "SCAN project" — полное чтение таблицы; "SEARCH ..." и "SCAN ... USING INDEX" (обход индекса) — нет
+        parts = detail.split()
+        if len(parts) >= 2 and parts[0] == 'SCAN' and 'USING' not in detail:
+            scans.append(parts[1])
+    return '\n'.join(details), scans
+
+
+def check_query_plans(threshold=1000):
+    sizes = table_sizes()
+    report = []
+    failed = False
+
+    for route, query in hot_queries().items():
+        plan, scans = sequential_scans(compile_sql(query))
+        problems = [t for t in scans if sizes.get(t, 0) > threshold]
+        failed = failed or bool(problems)
+        report.append({'route': route, 'plan': plan, 'seq_scans': scans, 'problems': problems})
+
+    return not failed, report
@@ -0,0 +1,56 @@
+import time
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+
+# Чтение с реплики (DATABASE_REPLICA_URL) для тяжёлых страниц, которые ничего не пишут.
+# Всё остальное — на основной сервер. Пользователь, который только что что-то записал,
+# REPLICA_STICKY_SECONDS читает с основного сервера: реплика может отставать,
+# а он должен видеть свой новый проект или изменённый профиль.
+
+REPLICA_BIND = 'replica'
+
+# GET-маршруты без записи в БД
+REPLICA_ENDPOINTS = {
+    'main.index',
+    'main.projects',
+    'main.search_projects',
+    'main.students',
+    'main.project_detail',
+    'main.api_stats',
+}
+
+STICKY_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # Запись (flush или множественные UPDATE/DELETE) — всегда основной сервер
+                g.db_wrote = True
+            elif g.get('use_replica'):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replicas(app):
+    if not app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA_BIND):
+        return
+
+    sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+
+    @app.before_request
+    def choose_database():
+        g.use_replica = (request.endpoint in REPLICA_ENDPOINTS
+                         and request.method in ('GET', 'HEAD')
+                         and session.get(STICKY_KEY, 0) <= time.time())
+
+    @app.after_request
+    def remember_write(response):
+        # Отметка в cookie сессии: следующий запрос может прийти в другой воркер
+        if g.get('db_wrote'):
+            session[STICKY_KEY] = time.time() + sticky_seconds
+        return response
@@ -1,17 +1,22 @@
 # reset_db.py
-from app import app, db
+from app import create_app, bootstrap_database
+from database import db
+from search_index import drop_search_index
 import sys
 
 print("🔄 Начинаю сброс базы данных...")
 
+app = create_app()
+
 with app.app_context():
     try:
         # Удаляем все таблицы
         db.drop_all()
+        drop_search_index()
         print("✅ Все таблицы удалены")
 
-        # Создаем заново
-        db.create_all()
+        # Создаем заново, применяем миграции и служебные индексы
+        bootstrap_database()
         print("✅ Все таблицы созданы заново")
         print("📊 Созданные таблицы:")
         print("   - User (пользователи)")
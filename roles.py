@@ -0,0 +1,68 @@
+from database import db, Project, ProjectRole
+
+
+# Роли проекта хранятся строками project_role. Текст needed_roles остаётся
+# исходником для формы и разбирается один раз — при создании и редактировании.
+
+DEFAULT_LEVEL = 'любой'
+
+
+def roles_text_from_form(data):
+    # Множественный выбор в форме даёт список ключей ролей
+    if isinstance(data, list):
+        return ''.join(f"{role}:средний\n" for role in data)
+    return data or ''
+
+
+def parse_roles(roles_text):
+    # Строка "роль:уровень" на каждой строке; строка без ':' может содержать роли через запятую
+    roles = []
+    for line in (roles_text or '').strip().split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        if ':' in line:
+            name, level = line.split(':', 1)
+            items = [(name.strip(), level.strip() or DEFAULT_LEVEL)]
+        else:
+            items = [(name.strip(), DEFAULT_LEVEL) for name in line.split(',')]
+
+        for name, level in items:
+            if name and name not in [r[0] for r in roles]:
+                roles.append((name[:100], level[:50]))
+    return roles
+
+
+def set_project_roles(project, roles_text):
+    project.needed_roles = roles_text
+    project.roles = [
+        ProjectRole(name=name, level=level, position=position)
+        for position, (name, level) in enumerate(parse_roles(roles_text))
+    ]
+
+
+def has_role(role_name):
+    # Фильтр по роли через индекс (name, project_id)
+    return Project.roles.any(ProjectRole.name == role_name)
+
+
+def backfill_project_roles(batch_size=500, commit=True):
+    # commit=False — внутри миграции: пачки только отправляются в базу (flush),
+    # транзакцию фиксирует upgrade()
+    ProjectRole.query.delete()
+    total = 0
+    last_id = 0
+    while True:
+        projects = Project.query.filter(Project.id > last_id).order_by(Project.id).limit(batch_size).all()
+        if not projects:
+            break
+        for project in projects:
+            set_project_roles(project, project.needed_roles)
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+        total += len(projects)
+        last_id = projects[-1].id
+    return total
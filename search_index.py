@@ -0,0 +1,262 @@
+import re
+from flask import current_app
+from sqlalchemy import text, func, literal_column, Integer, Float
+from database import db, Project, PROJECT_DELETED
+
+
+# Полнотекстовый поиск по проектам.
+# SQLite: отдельная таблица FTS5 project_fts (rowid = project.id) со стеммированным текстом,
+#         синхронизируется из маршрутов создания/редактирования/удаления проекта.
+# PostgreSQL: генерируемый столбец project.search_vector (конфигурация 'russian') и GIN-индекс,
+#         синхронизируется самой БД.
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND_1 = ('вшись', 'вши', 'в')
+PERFECTIVE_GERUND_2 = ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв')
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = ('ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое', 'ей', 'ий', 'ый', 'ой',
+             'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+VERB_1 = ('ешь', 'нно', 'ете', 'йте', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н')
+VERB_2 = ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют', 'ены',
+          'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю')
+NOUN = ('иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой',
+        'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у',
+        'ы', 'ь', 'ю', 'я')
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+# Стоп-слова словаря 'russian' PostgreSQL (Snowball): websearch_to_tsquery их отбрасывает,
+# build_match_query — тоже, иначе SQLite требовал бы в проекте "для", "и", "на"
+STOPWORDS = frozenset('''
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только
+ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни
+быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где
+есть надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж
+тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы нее
+сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше
+тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой
+перед иногда лучше чуть том нельзя такой им более всегда конечно всю между
+'''.split())
+
+# Слова короче этого не ищутся: однобуквенный префикс совпадает почти со всем
+MIN_WORD_LENGTH = 2
+
+
+def _strip(word, suffixes, after_a=False):
+    # Удаляет самое длинное подходящее окончание; для групп "1" перед ним должна стоять 'а' или 'я'
+    for suffix in sorted(suffixes, key=len, reverse=True):
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if after_a and not stem.endswith(('а', 'я')):
+                continue
+            return stem
+    return None
+
+
+def _strip_any(word, group_1, group_2):
+    stem = _strip(word, group_2)
+    if stem is None:
+        stem = _strip(word, group_1, after_a=True)
+    return stem
+
+
+def stem_russian(word):
+    # Упрощённый стеммер Snowball для русского языка
+    word = word.lower().replace('ё', 'е')
+    for i, ch in enumerate(word):
+        if ch in VOWELS:
+            prefix, rv = word[:i + 1], word[i + 1:]
+            break
+    else:
+        return word
+
+    stem = _strip_any(rv, PERFECTIVE_GERUND_1, PERFECTIVE_GERUND_2)
+    if stem is None:
+        rv = _strip(rv, REFLEXIVE) or rv
+        stem = _strip(rv, ADJECTIVE)
+        if stem is not None:
+            stem = _strip_any(stem, PARTICIPLE_1, PARTICIPLE_2) or stem
+        else:
+            stem = _strip_any(rv, VERB_1, VERB_2)
+            if stem is None:
+                stem = _strip(rv, NOUN)
+    rv = rv if stem is None else stem
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if len(rv) > 4:
+        rv = _strip(rv, DERIVATIONAL) or rv
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else superlative
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def stem_text(value):
+    return ' '.join(stem_russian(word) for word in WORD_RE.findall(value or ''))
+
+
+def is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# ---------- СОЗДАНИЕ ИНДЕКСА ----------
+
+def ensure_search_index():
+    if is_postgres():
+        db.session.execute(text(
+            "ALTER TABLE project ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+            ") STORED"
+        ))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_project_search_vector ON project USING GIN (search_vector)"
+        ))
+        db.session.commit()
+        current_app.extensions['fts_available'] = True
+        return
+
+    try:
+        exists = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'project_fts'"
+        )).first()
+        if not exists:
+            db.session.execute(text(
+                "CREATE VIRTUAL TABLE project_fts USING fts5(title, description, tokenize = 'unicode61')"
+            ))
+            db.session.commit()
+            rebuild_search_index()
+        current_app.extensions['fts_available'] = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ FTS5 недоступен, поиск работает без индекса: {e}")
+        current_app.extensions['fts_available'] = False
+
+
+def detect_search_index(app):
+    # Веб-воркеры ensure_search_index() не вызывают (индекс создаёт flask db-upgrade):
+    # наличие индекса проверяется один раз в create_app(), а не SQL-запросом в /search
+    with app.app_context():
+        if is_postgres():
+            available = True
+        else:
+            available = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'project_fts'"
+            )).first() is not None
+            db.session.remove()
+            # С gunicorn --preload соединение мастер-процесса не должно достаться воркерам
+            db.engine.dispose()
+    app.extensions['fts_available'] = available
+
+
+def fts_available():
+    return current_app.extensions.get('fts_available', False)
+
+
+def drop_search_index():
+    if not is_postgres():
+        db.session.execute(text("DROP TABLE IF EXISTS project_fts"))
+        db.session.commit()
+
+
+# ---------- СИНХРОНИЗАЦИЯ (только SQLite) ----------
+
+def index_project(project):
+    if not fts_available() or is_postgres():
+        return
+    remove_project(project.id)
+    db.session.execute(
+        text("INSERT INTO project_fts (rowid, title, description) VALUES (:id, :title, :description)"),
+        {'id': project.id, 'title': stem_text(project.title), 'description': stem_text(project.description)}
+    )
+
+
+def remove_project(project_id):
+    if not fts_available() or is_postgres():
+        return
+    db.session.execute(text("DELETE FROM project_fts WHERE rowid = :id"), {'id': project_id})
+
+
+def rebuild_search_index():
+    if is_postgres():
+        return 0
+    db.session.execute(text("DELETE FROM project_fts"))
+    projects = Project.query.filter(Project.status != PROJECT_DELETED).all()
+    for project in projects:
+        db.session.execute(
+            text("INSERT INTO project_fts (rowid, title, description) VALUES (:id, :title, :description)"),
+            {'id': project.id, 'title': stem_text(project.title), 'description': stem_text(project.description)}
+        )
+    db.session.commit()
+    return len(projects)
+
+
+# ---------- ПОИСК ----------
+
+def build_match_query(query_text):
+    # Каждое значимое слово запроса — стем с префиксным поиском, слова объединяются через AND
+    words = [word.lower().replace('ё', 'е') for word in WORD_RE.findall(query_text)]
+    stems = [stem_russian(word) for word in words
+             if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS]
+    return ' '.join(f'"{stem}"*' for stem in stems if stem)
+
+
+def apply_search(projects_query, query_text):
+    """Добавляет к запросу полнотекстовый фильтр и релевантность.
+
+    Возвращает запрос и параметры для paginate_keyset: ключ сортировки
+    (релевантность, id) и функции для извлечения ключа и проекта из строки.
+    """
+    if is_postgres():
+        ts_query = func.websearch_to_tsquery('russian', query_text)
+        search_vector = literal_column('project.search_vector')
+        # Тип нужен pagination: значения курсора сверяются с типом ключа сортировки
+        rank = func.ts_rank_cd(search_vector, ts_query, type_=Float)
+        projects_query = projects_query \
+            .filter(search_vector.op('@@')(ts_query)) \
+            .add_columns(rank.label('rank'))
+        return projects_query, _ranked_options(rank, descending=True)
+
+    if not fts_available():
+        projects_query = projects_query.filter(
+            (Project.title.ilike(f'%{query_text}%')) |
+            (Project.description.ilike(f'%{query_text}%'))
+        )
+        return projects_query, {'sort_keys': [(Project.created_at, True), (Project.id, True)]}
+
+    match = build_match_query(query_text)
+    if not match:
+        # В запросе одни стоп-слова и одиночные буквы — без фильтра, как пустой поиск
+        return projects_query, {'sort_keys': [(Project.created_at, True), (Project.id, True)]}
+
+    # bm25: чем меньше значение, тем выше релевантность; заголовок весит больше описания
+    matches = text(
+        "SELECT rowid AS project_id, bm25(project_fts, 10.0, 1.0) AS rank "
+        "FROM project_fts WHERE project_fts MATCH :match"
+    ).bindparams(match=match).columns(project_id=Integer, rank=Float).subquery()
+
+    projects_query = projects_query \
+        .join(matches, matches.c.project_id == Project.id) \
+        .add_columns(matches.c.rank)
+    return projects_query, _ranked_options(matches.c.rank, descending=False)
+
+
+def _ranked_options(rank, descending):
+    return {
+        'sort_keys': [(rank, descending), (Project.id, True)],
+        'key': lambda row: [row.rank, row.Project.id],
+        'entity': lambda row: row.Project,
+    }
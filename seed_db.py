@@ -0,0 +1,271 @@
+# seed_db.py
+import csv
+import io
+import random
+from bisect import bisect
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from sqlalchemy import text
+from werkzeug.security import generate_password_hash
+from database import (db, User, Skill, user_skill, Project, ProjectRole, Application, Message,
+                      Conversation, ReadMark, UnreadCounter)
+from search_index import rebuild_search_index, is_postgres
+from stats import reconcile_stats
+
+
+# Синтетические данные для бенчмарков и нагрузочных проверок. Строки вставляются
+# пачками с заранее назначенными id (executemany, на Postgres — COPY), поэтому
+# связанные таблицы — роли, навыки, сводки диалогов, отметки прочтения, счётчики —
+# считаются здесь же, без чтения из БД. Строки сообщений генерируются потоком:
+# в памяти одна пачка, а не миллион словарей. Заполняет пустую базу после bootstrap_database().
+
+SEED_PASSWORD = 'password'
+CHUNK_SIZE = 5000
+COPY_CHUNK_SIZE = 50000
+# Заготовленные фразы: генерация текста на каждое сообщение — основное время на миллионе строк
+SENTENCE_POOL_SIZE = 5000
+
+UNIVERSITIES = ['МГУ', 'СПбГУ', 'МФТИ', 'ВШЭ', 'МГТУ им. Баумана', 'ИТМО', 'НГУ', 'УрФУ', 'КФУ', 'ТГУ',
+                'МИФИ', 'РУДН', 'ЮФУ', 'ДВФУ', 'СамГУ']
+FACULTIES = ['ВМК', 'Физфак', 'Мехмат', 'Экономфак', 'Журфак', 'Химфак', 'ФКН', 'Биофак', 'Истфак', 'Юрфак']
+SKILLS = ['python', 'java', 'javascript', 'typescript', 'go', 'c++', 'c#', 'sql', 'postgresql', 'django',
+          'flask', 'react', 'vue', 'docker', 'linux', 'git', 'figma', 'photoshop', 'illustrator', 'design',
+          'ux', 'marketing', 'smm', 'копирайтинг', 'аналитика', 'excel', 'machine learning', 'pandas',
+          'статистика', 'управление проектами', 'agile', 'презентации', 'английский', '3d', 'unity',
+          'android', 'ios', 'kotlin', 'swift', 'data science']
+ROLES = ['backend', 'frontend', 'designer', 'manager', 'analyst', 'marketing', 'other']
+LEVELS = ['начальный', 'средний', 'продвинутый']
+CATEGORIES = ['it', 'business', 'design', 'science', 'social', 'other']
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+LOCATION_TYPES = ['online', 'offline', 'hybrid']
+TITLE_WORDS = ['Разработка', 'Создание', 'Исследование', 'Платформа', 'Приложение', 'Сервис', 'Система',
+               'Анализ', 'Дизайн', 'Запуск']
+SUBJECT_WORDS = ['мобильного приложения', 'чат-бота', 'сайта факультета', 'стартапа', 'игры', 'датасета',
+                 'маркетплейса', 'образовательной платформы', 'научной статьи', 'волонтёрского проекта',
+                 'сервиса расписания', 'системы рекомендаций']
+TEXT_WORDS = ['студенты', 'команда', 'проект', 'разработка', 'прототип', 'исследование', 'данные', 'пользователи',
+              'интерфейс', 'сервер', 'аналитика', 'презентация', 'университет', 'конкурс', 'грант', 'стартап',
+              'обучение', 'модель', 'тестирование', 'запуск', 'дизайн', 'маркетинг', 'хакатон', 'партнёры']
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def copy_rows(table, rows):
+    # COPY ... FROM STDIN в формате CSV через соединение текущей транзакции.
+    # NULL передаётся как \N: пустое поле в CSV — это пустая строка
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    count = 0
+    try:
+        for chunk in chunks(rows, COPY_CHUNK_SIZE):
+            columns = list(chunk[0])
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                ['\\N' if row[column] is None else row[column] for column in columns] for row in chunk)
+            buffer.seek(0)
+            column_list = ', '.join(f'"{column}"' for column in columns)
+            cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN '
+                               "WITH (FORMAT csv, NULL '\\N')", buffer)
+            count += len(chunk)
+    finally:
+        cursor.close()
+    return count
+
+
+def bulk_insert(table, rows):
+    if is_postgres():
+        return copy_rows(table, rows)
+    count = 0
+    for chunk in chunks(rows):
+        db.session.execute(table.insert(), chunk)
+        count += len(chunk)
+    return count
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(TEXT_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def weighted_picker(rng, weights):
+    # Выбор индекса с заданными весами за O(log n) по накопленным суммам
+    cumulative = list(accumulate(weights))
+    total = cumulative[-1]
+    return lambda: bisect(cumulative, rng.random() * total)
+
+
+def zipf_weights(rng, count, skew):
+    # Популярность по закону Ципфа: вес 1 / rank^skew, места перемешаны между объектами.
+    # skew=0 — равномерно, 1 — у самого популярного в разы больше, чем у десятого
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [rank ** -skew for rank in ranks]
+
+
+def chat_lengths(rng, threads, messages, tail, silent):
+    # Длины переписок с тяжёлым хвостом (распределение Парето с параметром tail):
+    # большинство — несколько сообщений, единицы — тысячи. Доля silent заявок без переписки.
+    # Сумма длин ровно messages
+    weights = [0.0 if rng.random() < silent else rng.paretovariate(tail) for _ in range(threads)]
+    total = sum(weights)
+    if not total:
+        return [0] * threads
+    lengths = [int(messages * weight / total) for weight in weights]
+    active = [i for i, weight in enumerate(weights) if weight]
+    for _ in range(messages - sum(lengths)):
+        lengths[rng.choice(active)] += 1
+    return lengths
+
+
+def seed_database(users=20000, projects=2000, applications=6000, messages=120000, seed=42,
+                  project_skew=1.0, chat_tail=1.2, silent_chats=0.3):
+    """Заполняет пустую базу: пользователи с навыками, проекты с ролями, заявки и переписка.
+
+    Заявки распределяются по проектам по закону Ципфа (project_skew), длины переписок —
+    с тяжёлым хвостом (chat_tail, меньше — длиннее хвост), silent_chats заявок без сообщений.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    started = now - timedelta(days=365)
+
+    # Хэш одного пароля на всех: scrypt на каждого пользователя занял бы минуты
+    password_hash = generate_password_hash(SEED_PASSWORD)
+
+    skill_ids = {name: i for i, name in enumerate(SKILLS, start=1)}
+    bulk_insert(Skill.__table__, ({'id': i, 'name': name} for name, i in skill_ids.items()))
+
+    user_rows, user_skill_rows, user_created = [], [], {}
+    for user_id in range(1, users + 1):
+        skills = rng.sample(SKILLS, rng.randint(2, 5))
+        created_at = started + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        user_created[user_id] = created_at
+        user_rows.append({
+            'id': user_id,
+            'username': f'user{user_id}',
+            'email': f'user{user_id}@example.com',
+            'password_hash': password_hash,
+            'full_name': f'Студент {user_id}',
+            'university': rng.choice(UNIVERSITIES),
+            'faculty': rng.choice(FACULTIES),
+            'course': rng.randint(1, 6),
+            'skills': ', '.join(skills),
+            'bio': '',
+            'created_at': created_at,
+        })
+        user_skill_rows.extend({'user_id': user_id, 'skill_id': skill_ids[name]} for name in skills)
+    bulk_insert(User.__table__, user_rows)
+    bulk_insert(user_skill, user_skill_rows)
+
+    project_rows, role_rows, project_creator, project_created = [], [], {}, {}
+    for project_id in range(1, projects + 1):
+        creator_id = rng.randint(1, users)
+        created_at = user_created[creator_id] + timedelta(seconds=rng.randrange(30 * 24 * 3600))
+        roles = [(name, rng.choice(LEVELS)) for name in rng.sample(ROLES, rng.randint(1, 4))]
+        project_creator[project_id] = creator_id
+        project_created[project_id] = created_at
+        project_rows.append({
+            'id': project_id,
+            'title': f'{rng.choice(TITLE_WORDS)} {rng.choice(SUBJECT_WORDS)} №{project_id}',
+            'description': ' '.join(sentence(rng) for _ in range(rng.randint(2, 6))),
+            'category': rng.choice(CATEGORIES),
+            'status': 'active',
+            'needed_roles': ''.join(f'{name}:{level}\n' for name, level in roles),
+            'difficulty': rng.choice(DIFFICULTIES),
+            'location_type': rng.choice(LOCATION_TYPES),
+            'university_filter': rng.choice(UNIVERSITIES + [''] * 5),
+            'faculty_filter': '',
+            'estimated_duration': f'{rng.randint(1, 12)} мес',
+            'creator_id': creator_id,
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+        role_rows.extend({'project_id': project_id, 'position': position, 'name': name, 'level': level}
+                         for position, (name, level) in enumerate(roles))
+    bulk_insert(Project.__table__, project_rows)
+    bulk_insert(ProjectRole.__table__, role_rows)
+
+    applications = min(applications, projects * (users - 1))
+    pick_project = weighted_picker(rng, zipf_weights(rng, projects, project_skew))
+    application_rows, pairs = [], set()
+    while len(application_rows) < applications:
+        project_id = pick_project() + 1
+        user_id = rng.randint(1, users)
+        if user_id == project_creator[project_id] or (project_id, user_id) in pairs:
+            continue
+        pairs.add((project_id, user_id))
+        application_rows.append({
+            'id': len(application_rows) + 1,
+            'project_id': project_id,
+            'user_id': user_id,
+            'message': sentence(rng, 20),
+            'applied_role': rng.choice(ROLES),
+            'status': rng.choice(['pending', 'pending', 'accepted', 'rejected']),
+            'created_at': project_created[project_id] + timedelta(seconds=rng.randrange(7 * 24 * 3600)),
+        })
+    bulk_insert(Application.__table__, application_rows)
+
+    lengths = chat_lengths(rng, len(application_rows), messages, chat_tail, silent_chats) if application_rows else []
+    pool = [sentence(rng, rng.randint(3, 25)) for _ in range(SENTENCE_POOL_SIZE)]
+    conversation_rows, mark_rows, unread = [], [], {}
+
+    def message_rows():
+        message_id = 0
+        for application, length in zip(application_rows, lengths):
+            applicant_id = application['user_id']
+            creator_id = project_creator[application['project_id']]
+            created_at = application['created_at']
+            thread, content = [], None
+            for _ in range(length):
+                message_id += 1
+                created_at += timedelta(seconds=rng.randint(30, 6 * 3600))
+                sender_id = applicant_id if rng.random() < 0.5 else creator_id
+                content = rng.choice(pool)
+                thread.append((message_id, sender_id))
+                yield {'id': message_id, 'application_id': application['id'], 'sender_id': sender_id,
+                       'content': content, 'created_at': created_at, 'is_read': False}
+
+            # Каждый участник прочитал начало переписки; непрочитанное — сообщения собеседника после отметки
+            conversation = {
+                'application_id': application['id'], 'project_id': application['project_id'],
+                'applicant_id': applicant_id, 'creator_id': creator_id,
+                'last_message_id': None, 'last_message_text': application['message'],
+                'last_message_at': application['created_at'],
+                'applicant_unread': 0, 'creator_unread': 0,
+            }
+            if thread:
+                conversation.update(last_message_id=thread[-1][0], last_message_text=content,
+                                    last_message_at=created_at)
+            for user_id, column in ((applicant_id, 'applicant_unread'), (creator_id, 'creator_unread')):
+                read = thread[:int(len(thread) * rng.choice([1, 1, 1, 0.9, 0.5]))]
+                if read:
+                    mark_rows.append({'application_id': application['id'], 'user_id': user_id,
+                                      'last_read_id': read[-1][0]})
+                conversation[column] = sum(1 for _, sender_id in thread[len(read):] if sender_id != user_id)
+                unread[user_id] = unread.get(user_id, 0) + conversation[column]
+            conversation_rows.append(conversation)
+
+    message_count = bulk_insert(Message.__table__, message_rows())
+    bulk_insert(Conversation.__table__, conversation_rows)
+    bulk_insert(ReadMark.__table__, mark_rows)
+    bulk_insert(UnreadCounter.__table__, ({'user_id': user_id, 'count': count}
+                                          for user_id, count in unread.items() if count))
+
+    if is_postgres():
+        # id вставлены явно — последовательности продолжают с максимального
+        for table in ('skill', 'user', 'project', 'project_role', 'application', 'message'):
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM \"{table}\"))"
+            ))
+    db.session.commit()
+
+    rebuild_search_index()
+    reconcile_stats()
+
+    return {'users': users, 'projects': projects, 'applications': len(application_rows),
+            'messages': message_count}
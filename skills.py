@@ -0,0 +1,70 @@
+from sqlalchemy import func
+from database import db, User, Skill, user_skill, upsert
+
+
+# Нормализованный индекс навыков. Исходная строка User.skills остаётся
+# для отображения и форм, а фильтрация и подсчёт идут по таблицам skill/user_skill.
+
+def parse_skills(skills_text):
+    skills = []
+    for skill in (skills_text or '').split(','):
+        skill = skill.strip().lower()[:100]
+        if skill and skill not in skills:
+            skills.append(skill)
+    return skills
+
+
+def get_or_create_skills(names):
+    if not names:
+        return []
+    existing = {s.name: s for s in Skill.query.filter(Skill.name.in_(names)).all()}
+    missing = [name for name in names if name not in existing]
+    if missing:
+        # Новый навык могут одновременно добавить две регистрации: вставка
+        # с ON CONFLICT DO NOTHING и повторный SELECT вместо add() и IntegrityError
+        db.session.execute(upsert(Skill).values([{'name': name} for name in missing])
+                           .on_conflict_do_nothing(index_elements=['name']))
+        existing.update((s.name, s) for s in Skill.query.filter(Skill.name.in_(missing)).all())
+    return [existing[name] for name in names]
+
+
+def set_user_skills(user, skills_text):
+    user.skill_items = get_or_create_skills(parse_skills(skills_text))
+
+
+def skill_facets():
+    # Навыки с количеством студентов — один сгруппированный запрос
+    return db.session.query(Skill.name, func.count(user_skill.c.user_id)) \
+        .join(user_skill, user_skill.c.skill_id == Skill.id) \
+        .group_by(Skill.id, Skill.name) \
+        .order_by(Skill.name) \
+        .all()
+
+
+def has_skill(skill_name):
+    # Точное совпадение навыка: "java" больше не находит "javascript"
+    return User.skill_items.any(Skill.name == skill_name.strip().lower())
+
+
+def backfill_user_skills(batch_size=500):
+    # Заполняет связи из существующих строк User.skills
+    db.session.execute(user_skill.delete())
+    total = 0
+    last_id = 0
+    while True:
+        users = User.query.filter(User.id > last_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        for user in users:
+            set_user_skills(user, user.skills)
+        db.session.commit()
+        total += len(users)
+        last_id = users[-1].id
+    return total
+
+
+def ensure_skill_index():
+    # Первый запуск после добавления таблиц — переносим навыки из строк
+    if Skill.query.first() is None and User.query.filter(User.skills != '').first() is not None:
+        count = backfill_user_skills()
+        print(f"✅ Навыки перенесены для пользователей: {count}")
@@ -0,0 +1,81 @@
+from datetime import datetime
+from database import db, User, Project, PlatformStat, PROJECT_DELETED, upsert
+
+
+# Счётчики платформы: обновляются в маршрутах создания/удаления в той же транзакции,
+# раз в час сверяются с таблицами командой 'flask reconcile-stats'.
+# Запись — upsert: первая строка счётчика и изменение существующей одним запросом,
+# без get-then-add, который падает с IntegrityError у параллельных запросов.
+
+STAT_NAMES = ('projects', 'users', 'universities')
+
+
+def increment_stat(name, delta=1):
+    # Увеличиваем на стороне БД, чтобы параллельные запросы не теряли изменения
+    statement = upsert(PlatformStat).values(name=name, value=max(delta, 0), updated_at=datetime.utcnow())
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'value': PlatformStat.value + delta, 'updated_at': statement.excluded.updated_at}
+    ))
+
+
+def set_stat(name, value):
+    statement = upsert(PlatformStat).values(name=name, value=value, updated_at=datetime.utcnow())
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'value': statement.excluded.value, 'updated_at': statement.excluded.updated_at}
+    ))
+
+
+def seed_stats(names):
+    # Строки счётчиков с нулём; существующие не трогаем
+    db.session.execute(upsert(PlatformStat)
+                       .values([{'name': name, 'value': 0, 'updated_at': datetime.utcnow()} for name in names])
+                       .on_conflict_do_nothing(index_elements=['name']))
+
+
+def count_universities():
+    return db.session.query(User.university) \
+        .filter(User.university.isnot(None), User.university != '') \
+        .distinct().count()
+
+
+def university_taken(university, user_id):
+    # Есть ли у ВУЗа другие студенты: EXISTS по индексу ix_user_university
+    others = User.query.filter(User.university == university, User.id != user_id)
+    return db.session.query(others.exists()).scalar()
+
+
+def track_university(user_id, new=None, old=None):
+    # Число ВУЗов меняется, только если у нового ВУЗа это первый студент, а у старого —
+    # последний; полный DISTINCT по пользователям — только в reconcile-stats
+    if new and not university_taken(new, user_id):
+        increment_stat('universities')
+    if old and not university_taken(old, user_id):
+        increment_stat('universities', -1)
+
+
+def refresh_stats():
+    # Пересчитывает все счётчики по таблицам; commit — за вызывающим
+    values = {
+        'projects': Project.query.filter(Project.status != PROJECT_DELETED).count(),
+        'users': User.query.count(),
+        'universities': count_universities()
+    }
+    for name, value in values.items():
+        set_stat(name, value)
+    return values
+
+
+def reconcile_stats():
+    values = refresh_stats()
+    db.session.commit()
+    return values
+
+
+def get_stats():
+    # Все счётчики одним запросом. Только чтение: маршруты с get_stats() читают с реплики,
+    # где строк может ещё не быть. Отсутствующий счётчик — 0 до миграции 8 или reconcile-stats
+    stats = dict.fromkeys(STAT_NAMES, 0)
+    stats.update((stat.name, stat.value) for stat in PlatformStat.query.filter(PlatformStat.name.in_(STAT_NAMES)))
+    return stats
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import has_request_context, session as flask_session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from database import db, User
+
+
+# Снимки пользователей для Flask-Login: опросы чата и счётчика непрочитанного
+# не делают SELECT пользователя на каждый запрос. Кэш свой в каждом процессе;
+# запись пользователя через ORM сбрасывает снимок в этом процессе, другие воркеры
+# gunicorn видят изменения через TTL. Свои изменения пользователь видит сразу
+# в любом воркере: время записи хранится в cookie сессии (FRESH_KEY), и снимки,
+# прочитанные раньше, для него не используются.
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1000))
+
+USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+FRESH_KEY = '_user_changed_at'
+
+
+class UserCache:
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()
+
+    def load(self, user_id, fresh_after=0):
+        # fresh_after — время (time.time()) последней записи пользователя;
+        # снимок, прочитанный до неё, устарел даже при живом TTL
+        now = time.monotonic()
+        with self._lock:
+            cached = self._snapshots.get(user_id)
+            if cached and cached[0] > now and cached[1] > fresh_after:
+                self._snapshots.move_to_end(user_id)
+                self.hits += 1
+                snapshot = cached[2]
+            else:
+                self.misses += 1
+                snapshot = None
+
+        if snapshot is None:
+            # Время до SELECT: строка не старше этого момента
+            loaded_at = time.time()
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.store(user, now, loaded_at)
+            return user
+
+        # Снимок подключается к сессии без SELECT; связи (навыки, проекты) грузятся лениво
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def store(self, user, now=None, loaded_at=None):
+        snapshot = {key: getattr(user, key) for key in USER_COLUMNS}
+        with self._lock:
+            self._snapshots[user.id] = ((now or time.monotonic()) + self.ttl, loaded_at or time.time(), snapshot)
+            self._snapshots.move_to_end(user.id)
+            while len(self._snapshots) > self.size:
+                self._snapshots.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._snapshots)}
+
+
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_SIZE)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    # edit_profile, перехэширование пароля при входе и любые другие изменения через ORM.
+    # Сбрасываем и после commit: между flush и commit параллельный запрос
+    # мог закэшировать ещё старую строку
+    user_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed_users(session):
+    changed = session.info.pop('changed_user_ids', ())
+    for user_id in changed:
+        user_cache.invalidate(user_id)
+    # Отметка в cookie сессии: следующий запрос может прийти в другой воркер
+    # со старым снимком (edit_profile -> redirect на /profile)
+    if has_request_context() and flask_session.get('_user_id') in {str(user_id) for user_id in changed}:
+        flask_session[FRESH_KEY] = time.time()
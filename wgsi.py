@@ -1,4 +1,10 @@
-from app import app
+from app import create_app, warmup
+
+# Точка входа gunicorn. С --preload приложение создаётся и шаблоны компилируются
+# один раз в мастер-процессе. Из БД мастер только проверяет индекс FTS5 (SQLite) и сразу
+# закрывает соединения (detect_search_index), поэтому воркеры открывают свои после fork
+app = create_app()
+warmup(app)
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()